@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+from collections import OrderedDict
+import io
+import time
+
+import click
+import simplejson
+
+from deltacode import DeltaCode
+from deltacode import __version__
+from deltacode.output import JSON_CHUNK_SIZE
+from deltacode.output import write_json
+from deltacode.utils import collect_errors
+from deltacode.utils import deltas
+from deltacode.utils import get_notice
+
+
+"""
+Measure the throughput of the DeltaCode JSON serialization on a pair of scans.
+Ensure you are in the DeltaCode virtualenv and run
+'python etc/scripts/benchmark_output.py -h'.
+"""
+
+
+def write_json_from_dicts(deltacode, outfile, all_delta_types=False):
+    """
+    Write the JSON results the way DeltaCode did before the direct writer:
+    build an OrderedDict for each Delta object and dump the whole results
+    with simplejson.
+    """
+    results = OrderedDict([
+        ('deltacode_notice', get_notice()),
+        ('new_scan_options', deltacode.new_scan_options),
+        ('old_scan_options', deltacode.old_scan_options),
+        ('deltacode_options', deltacode.options),
+        ('deltacode_version', __version__),
+        ('deltacode_errors', collect_errors(deltacode)),
+        ('deltas_count', len([d for d in deltas(deltacode, all_delta_types)])),
+        ('delta_stats', deltacode.stats.to_dict()),
+        ('deltas', deltas(deltacode, all_delta_types))
+    ])
+    simplejson.dump(results, outfile, iterable_as_array=True, indent=2)
+    outfile.write('\n')
+
+
+def time_writer(writer, deltacode, repeat, **kwargs):
+    """
+    Return a tuple of (best time in seconds, output text) for running a
+    `writer` function `repeat` times on a `deltacode` object, passing the
+    `kwargs` to the writer.
+    """
+    best = None
+    for _ in range(repeat):
+        outfile = io.StringIO()
+        start = time.perf_counter()
+        writer(deltacode, outfile, True, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, outfile.getvalue()
+
+
+def report(label, elapsed, deltas_count, output):
+    click.echo('{:<12} {:>8.3f} s {:>12.0f} deltas/s {:>8.2f} MB/s'.format(
+        label,
+        elapsed,
+        deltas_count / elapsed if elapsed else 0,
+        len(output) / elapsed / 1e6 if elapsed else 0,
+    ))
+
+
+@click.command()
+@click.option('-n', '--new', required=True, type=click.Path(exists=True, readable=True), help='Path to the "new" scan file')
+@click.option('-o', '--old', required=True, type=click.Path(exists=True, readable=True), help='Path to the "old" scan file')
+@click.option('-r', '--repeat', default=5, show_default=True, help='Number of timed runs of each writer')
+@click.option('-p', '--processes', type=click.IntRange(min=2), multiple=True, help='Also time the direct writer with this number of processes. Can be repeated.')
+@click.option('--chunk-size', default=JSON_CHUNK_SIZE, show_default=True, help='Number of deltas encoded at once by each process')
+@click.help_option('-h', '--help')
+def cli(new, old, repeat, processes, chunk_size):
+    """
+    Compare the throughput of the dictionary-based and direct JSON writers
+    on the deltas of a pair of scans, and of the direct writer with several
+    processes. For example:
+
+    python etc/scripts/benchmark_output.py -n new.json -o old.json -p 2 -p 4 -p 8
+    """
+    options = OrderedDict([
+        ('--new', new),
+        ('--old', old),
+        ('--all-delta-types', True)
+    ])
+    deltacode = DeltaCode(new, old, options)
+    deltas_count = len(deltacode.deltas)
+    click.echo('{} deltas'.format(deltas_count))
+
+    dict_time, dict_output = time_writer(write_json_from_dicts, deltacode, repeat)
+    report('dicts', dict_time, deltas_count, dict_output)
+
+    direct_time, direct_output = time_writer(write_json, deltacode, repeat)
+    report('direct', direct_time, deltas_count, direct_output)
+
+    if direct_output != dict_output:
+        raise click.ClickException('The direct writer output differs from the dictionary-based output.')
+    click.echo('speedup: {:.2f}x'.format(dict_time / direct_time if direct_time else 0))
+
+    for count in processes:
+        parallel_time, parallel_output = time_writer(
+            write_json, deltacode, repeat, processes=count, chunk_size=chunk_size)
+        report('{} procs'.format(count), parallel_time, deltas_count, parallel_output)
+        if parallel_output != direct_output:
+            raise click.ClickException('The output with {} processes differs from the sequential output.'.format(count))
+        click.echo('scaling: {:.2f}x'.format(direct_time / parallel_time if parallel_time else 0))
+
+
+if __name__ == '__main__':
+    cli()
@@ -24,43 +24,38 @@
 #
 
 from __future__ import print_function
-import unicodecsv
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import codecs
 from collections import OrderedDict
-import json
 import os
 
 import click
 click.disable_unicode_literals_warning = True
+import unicodecsv
+
+from deltacode.utils import iter_json_deltas
 
 
 """
-Convert a DeltaCode JSON file to a CSV.
+Convert a DeltaCode JSON or JSON Lines file to a CSV.
 Ensure you are in the DeltaCode virtualenv and run 'python etc/scripts/json2csv.py -h'.
 """
 
 
 def load_deltas(json_input):
     """
-    Return a list of DeltaCode results loaded from a json_input, in
-    DeltaCode standard JSON format.
+    Return an iterator of DeltaCode results loaded from a json_input, in
+    DeltaCode standard JSON or JSON Lines format. The deltas are read one at
+    a time as the iterator is consumed.
     """
-    with codecs.open(json_input, 'rb', encoding='utf-8') as jsonf:
-        delta = jsonf.read()
-
-    delta_results = json.loads(delta, object_pairs_hook=OrderedDict)
-
-    delta_results = delta_results['deltas']
-
-    return delta_results
+    return iter_json_deltas(json_input)
 
 
 def json_delta_to_csv(json_input, csv_output):
     """
-    Convert a DeltaCode JSON output file to a CSV.
+    Convert a DeltaCode JSON output file to a CSV, writing each row as soon as
+    its delta is read.
     """
     delta_results = load_deltas(json_input)
 
@@ -75,29 +70,17 @@ def json_delta_to_csv(json_input, csv_output):
         ('Old Path', []),
     ])
 
-    rows = list(flatten_deltas(delta_results, headers))
-
     w = unicodecsv.DictWriter(csv_output, headers)
     w.writeheader()
 
-    for r in rows:
+    for r in flatten_deltas(delta_results, headers):
         w.writerow(r)
 
 
 def flatten_deltas(deltas, headers):
-    if len(deltas) < 1:
-        yield OrderedDict([
-            ('Status', ''),
-            ('Score', ''),
-            ('Factors', ''),
-            ('Path', ''),
-            ('Name', ''),
-            ('Type', ''),
-            ('Size', ''),
-            ('Old Path', ''),
-        ])
-
+    empty = True
     for delta in deltas:
+        empty = False
         new, old = delta.get('new'), delta.get('old')
         if new is None:
             new = {}
@@ -117,6 +100,18 @@ def flatten_deltas(deltas, headers):
              if 'moved' == delta.get('status') else ''),
         ])
 
+    if empty:
+        yield OrderedDict([
+            ('Status', ''),
+            ('Score', ''),
+            ('Factors', ''),
+            ('Path', ''),
+            ('Name', ''),
+            ('Type', ''),
+            ('Size', ''),
+            ('Old Path', ''),
+        ])
+
 
 @click.command()
 @click.argument('json_input', type=click.Path(exists=True, readable=True))
@@ -124,7 +119,7 @@ def flatten_deltas(deltas, headers):
 @click.help_option('-h', '--help')
 def cli(json_input, csv_output):
     """
-    Convert a DeltaCode JSON file to a CSV file. For example:
+    Convert a DeltaCode JSON or JSON Lines file to a CSV file. For example:
 
     python etc/scripts/json2csv.py  /c/input.json /c/output.csv
     """
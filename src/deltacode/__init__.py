@@ -26,6 +26,7 @@
 from __future__ import absolute_import
 
 import os
+import time
 from collections import OrderedDict
 
 from deltacode import utils
@@ -43,219 +44,399 @@ except DistributionNotFound:
 
 SIMILARITY_LIMIT = 35
 
+# TODO: Figure out the best way to handle this.
+UNIQUE_LICENSE_CATEGORIES = set(
+    [
+        "Commercial",
+        "Copyleft",
+        "Copyleft Limited",
+        "Free Restricted",
+        "Patent License",
+        "Proprietary Free",
+    ]
+)
+
+
+def update_similarity(delta):
+    """
+    Compare the fingerprints of a pair of 'new' and 'old' File objects
+    in a Delta object and change the Delta object's 'score' attribute --
+    and add an appropriate category 'Similar with hamming distance'
+    to the Delta object's 'factors' attribute -- if the hamming
+    distance is less than the threshold distance.
+    """
+    if delta.new_file == None or delta.old_file == None:
+        return
+    new_fingerprint = (
+        delta.new_file.fingerprint
+        if hasattr(delta.new_file, "fingerprint")
+        else None
+    )
+    old_fingerprint = (
+        delta.old_file.fingerprint
+        if hasattr(delta.old_file, "fingerprint")
+        else None
+    )
+
+    if new_fingerprint == None or old_fingerprint == None:
+        return
+    new_fingerprint = utils.bitarray_from_hex(delta.new_file.fingerprint)
+    old_fingerprint = utils.bitarray_from_hex(delta.old_file.fingerprint)
+
+    hamming_distance = utils.hamming_distance(new_fingerprint, old_fingerprint)
+    if hamming_distance > 0 and hamming_distance <= SIMILARITY_LIMIT:
+        delta.score += hamming_distance
+        delta.factors.append(
+            "Similar with hamming distance : {}".format(hamming_distance)
+        )
+
+
+def score_delta(delta, category_masks=None):
+    """
+    Update the 'score' and 'factors' of a Delta object for its license,
+    copyright and fingerprint changes, as DeltaCode does for each Delta.
+    `category_masks` is the utils.CategoryMasks of the license categories
+    shared by the Delta objects of a comparison, if any.
+    """
+    if category_masks is None:
+        category_masks = utils.CategoryMasks(UNIQUE_LICENSE_CATEGORIES)
+    utils.update_from_license_info(delta, category_masks)
+    utils.update_from_copyright_info(delta)
+    update_similarity(delta)
+
+
+def load_codebases(new_path, old_path):
+    """
+    Return a tuple of the VirtualCodebases of the 'new' and 'old' scan files
+    at `new_path` and `old_path`, possibly compressed.
+    """
+    if os.path.isfile(new_path) and os.path.isfile(old_path):
+        return (
+            VirtualCodebase(utils.load_scan(new_path)),
+            VirtualCodebase(utils.load_scan(old_path)),
+        )
+    error_message = (
+        "{} is expected to be a file".format(new_path)
+        if not os.path.isfile(new_path)
+        else "{} is expected to be a file".format(old_path)
+    )
+    raise utils.FileError(error_message)
+
+
+def get_stats(codebase1, codebase2):
+    """
+    Return the Stat object of the changes from the 'old' `codebase2` to the
+    'new' `codebase1`, as in the 'delta_stats' of a DeltaCode, straight from
+    the matching of their files: no Delta object is created or scored.
+    """
+    try:
+        new_offset, old_offset = utils.align_trees(codebase1, codebase2)
+    except utils.AlignmentException:
+        new_offset, old_offset = 0, 0
+
+    stats = Stat(codebase1.compute_counts()[0], codebase2.compute_counts()[0])
+    for match in utils.match_resources(codebase1, codebase2, new_offset, old_offset):
+        stats.count(match[0])
+    stats.calculate_stats()
+    return stats
+
 
 class DeltaCode(object):
     """
     Handle the basic operations on a pair of incoming ScanCode scans (in JSON
     format) and the Delta objects created from a comparison of the files (in
     the form of File objects) contained in those scans.
+
+    If `codebases` is provided, it is a tuple of the already loaded 'new' and
+    'old' VirtualCodebases of the scans at `new_path` and `old_path`.
+
+    The comparison runs in the STAGES order: each stage method runs the
+    stages before it that have not run yet, runs once and returns its
+    result. By default, all the stages run on creation. If `lazy` is True,
+    no stage runs until one of the stage methods is called, e.g., match()
+    for the Delta objects and the 'stats' without any scoring or sorting.
+
+    If `time_budget` is provided, the match and scoring stages stop once
+    this number of seconds has passed since the creation: the files left to
+    match get an 'unclassified' Delta object, the Delta objects left to score
+    keep their base score, and each truncated stage is listed in
+    'truncated_stages' and reported in the 'errors'.
     """
 
-    def __init__(self, new_path, old_path, options):
+    STAGES = (
+        "load",
+        "align",
+        "match",
+        "score_licenses",
+        "score_copyrights",
+        "score_similarity",
+        "rank",
+    )
+
+    def __init__(self, new_path, old_path, options, codebases=None, lazy=False,
+                 time_budget=None):
+        self.new_path = new_path
+        self.old_path = old_path
         self.codebase1 = None
         self.codebase2 = None
         self.options = options
         self.deltas = []
         self.errors = []
-
-        if os.path.isfile(new_path) and os.path.isfile(old_path):
-            self.codebase1 = VirtualCodebase(new_path)
-            self.codebase2 = VirtualCodebase(old_path)
-        else:
-            error_message = (
-                "{} is expected to be a file".format(new_path)
-                if not os.path.isfile(new_path)
-                else "{} is expected to be a file".format(old_path)
-            )
-            raise utils.FileError(error_message)
-        self.stats = Stat(
-            self.codebase1.compute_counts(
-            )[0], self.codebase2.compute_counts()[0]
-        )
+        self.stats = None
+        self.offsets = None
         self.new_scan_options = []
         self.old_scan_options = []
         self.new_files_errors = []
         self.old_files_errors = []
-        self.determine_delta()
-        self.options_diff()
-        self.license_diff()
-        self.copyright_diff()
-        self.stats.calculate_stats()
-        self.similarity()
-        # Sort deltas by score, descending, i.e., high > low, and then by
-        # factors, alphabetically.  Run the least significant sort first.
-        self.deltas.sort(key=lambda Delta: Delta.factors, reverse=False)
-        self.deltas.sort(key=lambda Delta: Delta.score, reverse=True)
+        # the names of the stages already run
+        self.completed_stages = set()
+        self.deadline = None
+        if time_budget is not None:
+            self.deadline = time.monotonic() + time_budget
+        self.truncated_stages = []
+        if codebases:
+            self.codebase1, self.codebase2 = codebases
+        if not lazy:
+            self.rank()
+
+    def run_stage(self, stage, function):
+        """
+        Run the `stage` named stage with `function` unless it already ran.
+        """
+        if stage not in self.completed_stages:
+            function()
+            self.completed_stages.add(stage)
 
-    def similarity(self):
+    def is_expired(self):
         """
-        Compare the fingerprints of a pair of 'new' and 'old' File objects
-        in a Delta object and change the Delta object's 'score' attribute --
-        and add an appropriate category 'Similar with hamming distance'
-        to the Delta object's 'factors' attribute -- if the hamming
-        distance is less than the threshold distance.
-        """
-        for delta in self.deltas:
-            if delta.new_file == None or delta.old_file == None:
-                continue
-            new_fingerprint = (
-                delta.new_file.fingerprint
-                if hasattr(delta.new_file, "fingerprint")
-                else None
+        Return True if the time budget is spent.
+        """
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def truncate(self, stage, done, total, items="files"):
+        """
+        Record that the `stage` named stage stopped after `done` of `total`
+        items when the time budget was spent.
+        """
+        self.truncated_stages.append(stage)
+        self.errors.append(
+            "Time budget exceeded: the {} stage stopped after {} of {} {}.".format(
+                stage, done, total, items
             )
-            old_fingerprint = (
-                delta.old_file.fingerprint
-                if hasattr(delta.old_file, "fingerprint")
-                else None
+        )
+
+    def iter_in_budget(self, stage):
+        """
+        Yield the Delta objects for the `stage` named scoring stage until the
+        time budget is spent.
+        """
+        for done, delta in enumerate(self.deltas):
+            if self.is_expired():
+                self.truncate(stage, done, len(self.deltas), "deltas")
+                return
+            yield delta
+
+    def load(self):
+        """
+        Load the 'new' and 'old' codebases unless they were provided, with
+        their files counts and scan options. Return a tuple of the codebases.
+        """
+        def load_stage():
+            if not self.codebase1:
+                self.codebase1, self.codebase2 = load_codebases(self.new_path, self.old_path)
+            self.stats = Stat(
+                self.codebase1.compute_counts()[0], self.codebase2.compute_counts()[0]
             )
+            self.options_diff()
 
-            if new_fingerprint == None or old_fingerprint == None:
-                continue
-            new_fingerprint = utils.bitarray_from_hex(
-                delta.new_file.fingerprint)
-            old_fingerprint = utils.bitarray_from_hex(
-                delta.old_file.fingerprint)
-
-            hamming_distance = utils.hamming_distance(
-                new_fingerprint, old_fingerprint)
-            if hamming_distance > 0 and hamming_distance <= SIMILARITY_LIMIT:
-                delta.score += hamming_distance
-                delta.factors.append(
-                    "Similar with hamming distance : {}".format(
-                        hamming_distance)
-                )
+        self.run_stage("load", load_stage)
+        return self.codebase1, self.codebase2
+
+    def align(self):
+        """
+        Align the trees of the loaded codebases. Return a tuple of the number
+        of leading path segments to remove from the 'new' and 'old' paths.
+        """
+        def align_stage():
+            self.load()
+            try:
+                self.offsets = utils.align_trees(self.codebase1, self.codebase2)
+            except utils.AlignmentException:
+                self.offsets = 0, 0
+
+        self.run_stage("align", align_stage)
+        return self.offsets
+
+    def match(self):
+        """
+        Create the Delta objects of the matched files of the aligned
+        codebases, with their base scores, and compute the 'stats'. Return
+        the list of Delta objects.
+        """
+        def match_stage():
+            self.align()
+            self.determine_delta()
+            self.stats.calculate_stats()
+
+        self.run_stage("match", match_stage)
+        return self.deltas
+
+    def score_licenses(self):
+        """
+        Score the license changes of the Delta objects. Return the list of
+        Delta objects.
+        """
+        def score_licenses_stage():
+            self.match()
+            self.license_diff()
+
+        self.run_stage("score_licenses", score_licenses_stage)
+        return self.deltas
+
+    def score_copyrights(self):
+        """
+        Score the copyright changes of the Delta objects. Return the list of
+        Delta objects.
+        """
+        def score_copyrights_stage():
+            self.score_licenses()
+            self.copyright_diff()
+
+        self.run_stage("score_copyrights", score_copyrights_stage)
+        return self.deltas
+
+    def score_similarity(self):
+        """
+        Score the fingerprint similarity of the Delta objects. Return the list
+        of Delta objects.
+        """
+        def score_similarity_stage():
+            self.score_copyrights()
+            self.similarity()
+
+        self.run_stage("score_similarity", score_similarity_stage)
+        return self.deltas
+
+    def rank(self):
+        """
+        Sort the scored Delta objects by score. Return the list of Delta
+        objects.
+        """
+        def rank_stage():
+            self.score_similarity()
+            # Sort deltas by score, descending, i.e., high > low, and then by
+            # factors, alphabetically.  Run the least significant sort first.
+            self.deltas.sort(key=lambda Delta: Delta.factors, reverse=False)
+            self.deltas.sort(key=lambda Delta: Delta.score, reverse=True)
+
+        self.run_stage("rank", rank_stage)
+        return self.deltas
+
+    def iter_deltas(self, ranked=False):
+        """
+        Yield the scored Delta objects, in the order of the matching of their
+        files or, if `ranked` is True, ranked by score.
+
+        Unless the files are already matched or there is a time budget, each
+        Delta object is scored and
+        yielded as soon as its files are matched, and the matching stops when
+        the caller stops iterating. The Delta objects and the 'stats' are
+        kept and the scoring stages are completed only once all the Delta
+        objects are yielded.
+        """
+        if ranked:
+            for delta in self.rank():
+                yield delta
+            return
+        if "match" in self.completed_stages or self.deadline is not None:
+            for delta in self.score_similarity():
+                yield delta
+            return
+
+        new_offset, old_offset = self.align()
+        deltas = []
+        stats = Stat(self.stats.new_files_count, self.stats.old_files_count)
+        category_masks = utils.CategoryMasks(UNIQUE_LICENSE_CATEGORIES)
+        matches = utils.match_resources(
+            self.codebase1, self.codebase2, new_offset, old_offset
+        )
+        for status, score, new_resource, old_resource, path_new, path_old in matches:
+            delta = self.create_deltas(
+                new_resource, old_resource, score, status, path_new, path_old, deltas
+            )
+            score_delta(delta, category_masks)
+            stats.count(status)
+            yield delta
+
+        stats.calculate_stats()
+        self.deltas = deltas
+        self.stats = stats
+        self.completed_stages.update(self.STAGES[:self.STAGES.index("rank")])
+
+    def similarity(self):
+        """
+        Compare the fingerprints of a pair of 'new' and 'old' File objects
+        in each Delta object with update_similarity().
+        """
+        for delta in self.iter_in_budget("score_similarity"):
+            update_similarity(delta)
 
     def create_deltas(
-        self, new_resource, old_resource, score, status
+        self, new_resource, old_resource, score, status, new_path=None, old_path=None,
+        deltas=None
     ):
         """
-        Creates the Delta Objects and appends them to the member list.
+        Creates the Delta Objects and appends them to the `deltas` list, by
+        default the member list. Return the Delta object.
+        `new_path` and `old_path` are the aligned paths of the resources.
         """
         delta = Delta(score, new_resource, old_resource)
+        if self.offsets:
+            delta.new_offset, delta.old_offset = self.offsets
         delta.status = status
-        self.deltas.append(delta)
+        delta.new_path = new_path
+        delta.old_path = old_path
+        (self.deltas if deltas is None else deltas).append(delta)
+        return delta
 
     def determine_delta(self):
         """
-        Create Delta objects and append them to the list. Top Down BFS Traversal is used
-        to visit the codebase structures of the old and new Codebase Directiries.
+        Create Delta objects and append them to the list, for each file of the
+        new and old codebases aligned and matched by utils.match_resources().
+        If the time budget is spent before all the 'new' files are matched,
+        create 'unclassified' Delta objects for the files left instead.
         """
-
-        old_resource_considered = set()
-        # Set to keep track of the old resources visited
-        try:
-            Delta.NEW_CODEBASE_OFFSET, Delta.OLD_CODEBASE_OFFSET = utils.align_trees(
-                self.codebase1, self.codebase2
-            )
-        except utils.AlignmentException:
-            Delta.NEW_CODEBASE_OFFSET, Delta.OLD_CODEBASE_OFFSET = 0, 0
-
-        for new_resource in self.codebase1.walk():
-            # Visit each resource of the new codebase in a Top Down BFS fashion
-            if new_resource.is_file:
-                path_new = "/".join(
-                    paths.split(new_resource.path)[Delta.NEW_CODEBASE_OFFSET:]
-                )
-            # If the resource is a file align its path
-
-                old_resource = self.codebase2.get_resource(path_new)
-                # Check in the old codebase weather a resource with such a path exists or not
-                # if it exists and their corresponding sha's are same then its an unmodified delta
-
-                if old_resource and old_resource.sha1 == new_resource.sha1:
-                    old_resource_considered.add(old_resource.path)
-                    path_old = "/".join(
-                        paths.split(old_resource.path)[
-                            Delta.OLD_CODEBASE_OFFSET:]
-                    )
-                    self.create_deltas(
-                        new_resource, old_resource, 0, "unmodified",
-                    )
-                    self.stats.num_unmodified += 1
-
-                    continue
-
-                # Now when  we do not get old resources with the same name
-                ADDED = True
-                for old_resource in self.codebase2.walk():
-                    # Visit each resource of the new codebase in a Bottom Up BFS fashion
-                    if old_resource.path in old_resource_considered:
-                        # If old resources are previously considered then continue
-                        continue
-                    path_old = "/".join(
-                        paths.split(old_resource.path)[
-                            Delta.OLD_CODEBASE_OFFSET:]
-                    )
-                    # Make the path aligned
-                    if (
-                        old_resource.is_file
-                        and not old_resource.path in old_resource_considered
-                    ):
-                        # If the old resource is a file and currently unvisited
-
-                        if path_new == path_old:
-                            # Old and New Resources are having the same path after alignment
-                            ADDED = False
-                            if new_resource.sha1 == old_resource.sha1:
-                                # They are having same sha1
-                                old_resource_considered.add(old_resource.path)
-                                self.create_deltas(
-                                    new_resource,
-                                    old_resource,
-                                    0,
-                                    "unmodified",
-                                )
-                                self.stats.num_unmodified += 1
-                                break
-                            else:
-                                # They are having different sha1
-                                old_resource_considered.add(old_resource.path)
-                                self.create_deltas(
-                                    new_resource,
-                                    old_resource,
-                                    20,
-                                    "modified",
-                                )
-                                self.stats.num_modified += 1
-                                break
-                        else:
-                            # Their paths are different
-                            if new_resource.sha1 == old_resource.sha1:
-                                # THey are having the same sha1
-                                old_resource_considered.add(old_resource.path)
-                                ADDED = False
-                                self.create_deltas(
-                                    new_resource,
-                                    old_resource,
-                                    0,
-                                    "moved",
-                                )
-                                self.stats.num_moved += 1
-                                break
-
-                if ADDED:
-                    # If none of the above criteria matches then the delta is an added one.
-                    self.create_deltas(
-                        new_resource, None, 100, "added",
-                    )
-                    self.stats.num_added += 1
-
-        for old_resource_remaining in self.codebase2.walk():
-            # Now again visit the old codebase in a top down fashion
-            # If any delta is left out it is a case of removed delta
-            if (
-                old_resource_remaining.is_file
-                and old_resource_remaining.path not in old_resource_considered
-            ):
-                path_old = "/".join(
-                    paths.split(old_resource_remaining.path)[
-                        Delta.OLD_CODEBASE_OFFSET:
-                    ]
-                )
-                self.create_deltas(
-                    None, old_resource_remaining, 0, "removed",
-                )
-                self.stats.num_removed += 1
+        new_offset, old_offset = self.offsets
+        matches = utils.match_resources(
+            self.codebase1, self.codebase2, new_offset, old_offset
+        )
+        for status, score, new_resource, old_resource, path_new, path_old in matches:
+            # the 'removed' files come last and need no more matching
+            if status != "removed" and self.is_expired():
+                self.truncate("match", len(self.deltas), self.stats.new_files_count)
+                self.create_unclassified_deltas()
+                return
+            self.create_deltas(new_resource, old_resource, score, status, path_new, path_old)
+            self.stats.count(status)
+
+    def create_unclassified_deltas(self):
+        """
+        Create an 'unclassified' Delta object for each 'new' and 'old' file
+        without a Delta object.
+        """
+        new_offset, old_offset = self.offsets
+        new_paths = set(delta.new_file.path for delta in self.deltas if delta.new_file)
+        old_paths = set(delta.old_file.path for delta in self.deltas if delta.old_file)
+        for resource in self.codebase1.walk():
+            if resource.is_file and resource.path not in new_paths:
+                path_new = utils.aligned_path(resource.path, new_offset)
+                self.create_deltas(resource, None, 0, "unclassified", path_new, None)
+                self.stats.count("unclassified")
+        for resource in self.codebase2.walk():
+            if resource.is_file and resource.path not in old_paths:
+                path_old = utils.aligned_path(resource.path, old_offset)
+                self.create_deltas(None, resource, 0, "unclassified", None, path_old)
+                self.stats.count("unclassified")
 
     def license_diff(self):
         """
@@ -265,20 +446,9 @@ class DeltaCode(object):
         'copyleft added') to the Delta object's 'factors' attribute -- if there
         has been a license change.
         """
-        # TODO: Figure out the best way to handle this.
-        unique_categories = set(
-            [
-                "Commercial",
-                "Copyleft",
-                "Copyleft Limited",
-                "Free Restricted",
-                "Patent License",
-                "Proprietary Free",
-            ]
-        )
-
-        for delta in self.deltas:
-            utils.update_from_license_info(delta, unique_categories)
+        category_masks = utils.CategoryMasks(UNIQUE_LICENSE_CATEGORIES)
+        for delta in self.iter_in_budget("score_licenses"):
+            utils.update_from_license_info(delta, category_masks)
 
     def copyright_diff(self):
         """
@@ -288,7 +458,7 @@ class DeltaCode(object):
         info added' or 'copyright change') to the Delta object's 'factors'
         attribute -- if there has been a copyright change.
         """
-        for delta in self.deltas:
+        for delta in self.iter_in_budget("score_copyrights"):
             utils.update_from_copyright_info(delta)
 
     def options_diff(self):
@@ -306,18 +476,35 @@ class Delta(object):
     A tuple reflecting a comparison of two files -- each of which is a File
     object -- and the 'factors' (e.g., 'added', 'modified' etc.) and related
     'score' that characterize that comparison.
-    """
 
-    NEW_CODEBASE_OFFSET = 0
-    OLD_CODEBASE_OFFSET = 0
+    The `new_offset` and `old_offset` are the number of leading segments
+    removed by the tree alignment of the codebases of the files.
+    """
 
     def __init__(self, score=0, new_file=None, old_file=None):
         self.new_file = new_file if new_file else None
         self.old_file = old_file if old_file else None
+        self.new_path = None
+        self.old_path = None
+        self.new_offset = 0
+        self.old_offset = 0
         self.factors = []
         self.score = score
         self.status = ""
 
+    def aligned_path(self, new_file=True):
+        """
+        Return the aligned path of the 'new' or 'old' file of the Delta object,
+        i.e., its path without the segments removed by the tree alignment.
+        """
+        if new_file:
+            file, path, path_offset = self.new_file, self.new_path, self.new_offset
+        else:
+            file, path, path_offset = self.old_file, self.old_path, self.old_offset
+        if path is None and file:
+            path = "/".join(paths.split(file.path)[path_offset:])
+        return path
+
     def update(self, score=0, factor=""):
         """
         Add the score to the Delta object's 'score' attribute and add a string,
@@ -404,59 +591,50 @@ class Delta(object):
         except:
             return []
 
-    def file_to_dict(self, deltacode, file, new_file=True):
-
-        path_offset = (
-            Delta.NEW_CODEBASE_OFFSET if new_file else Delta.OLD_CODEBASE_OFFSET
-        )
+    def file_to_dict(self, deltacode, file, new_file=True, file_fields=utils.FILE_FIELDS):
+        """
+        Return an OrderedDict of the `file_fields` of the 'new' or 'old'
+        `file` resource, computing only these fields.
+        """
         if file:
-            return OrderedDict(
-                [
-                    ("path", "/".join(paths.split(file.path)[path_offset:])),
-                    ("type", file.type),
-                    ("name", file.name),
-                    ("size", file.size),
-                    ("sha1", file.sha1),
-                    (
-                        "fingerprint",
-                        file.fingerprint if hasattr(
-                            file, "fingerprint") else "",
-                    ),
-                    ("original_path", file.path),
-                    ("licenses", self.licenses_to_dict(file)),
-                    ("copyrights", self.copyrights_to_dict(file)),
-                ]
-            )
-
-    def to_dict(self, deltacode):
+            values = OrderedDict()
+            for field in file_fields:
+                if field == "path":
+                    values[field] = self.aligned_path(new_file)
+                elif field == "fingerprint":
+                    values[field] = file.fingerprint if hasattr(file, "fingerprint") else ""
+                elif field == "original_path":
+                    values[field] = file.path
+                elif field == "licenses":
+                    values[field] = self.licenses_to_dict(file)
+                elif field == "copyrights":
+                    values[field] = self.copyrights_to_dict(file)
+                else:
+                    values[field] = getattr(file, field)
+            return values
+
+    def to_dict(self, deltacode, fields=None):
         """
         Return an OrderedDict comprising the 'factors', 'score' and new and old
-        'path' attributes of the object.
+        'path' attributes of the object.  If `fields` is provided, as returned
+        by utils.parse_fields(), return only the selected fields.
         """
         if (
             not deltacode.options.get("--all-delta-types", "") == True
             and self.status == "unmodified"
         ):
             return
-        if self.new_file:
-            new_file = self.new_file.to_dict()
-        else:
-            new_file = None
 
-        if self.old_file:
-            old_file = self.old_file.to_dict()
-        else:
-            old_file = None
-
-        return OrderedDict(
-            [
-                ("status", self.status),
-                ("factors", self.factors),
-                ("score", self.score),
-                ("new", self.file_to_dict(deltacode, self.new_file, new_file=True)),
-                ("old", self.file_to_dict(deltacode, self.old_file, new_file=False)),
-            ]
-        )
+        delta_fields, file_fields = fields or (utils.DELTA_FIELDS, utils.FILE_FIELDS)
+        values = OrderedDict()
+        for field in delta_fields:
+            if field == "new":
+                values[field] = self.file_to_dict(deltacode, self.new_file, True, file_fields)
+            elif field == "old":
+                values[field] = self.file_to_dict(deltacode, self.old_file, False, file_fields)
+            else:
+                values[field] = getattr(self, field)
+        return values
 
 
 class Stat(object):
@@ -473,12 +651,20 @@ class Stat(object):
         self.num_moved = 0
         self.num_modified = 0
         self.num_unmodified = 0
+        self.num_unclassified = 0
         self.percent_added = 0
         self.percent_removed = 0
         self.percent_moved = 0
         self.percent_modified = 0
         self.percent_unmodified = 0
 
+    def count(self, status):
+        """
+        Count one more file with a Delta 'status' such as 'added'.
+        """
+        name = "num_" + status
+        setattr(self, name, getattr(self, name) + 1)
+
     def calculate_stats(self):
         """
         Calculates the percentage change of new directory with respect to
@@ -503,8 +689,10 @@ class Stat(object):
     def to_dict(self):
         """
         Return an OrderedDict comprising all the percent attributes of the object.
+        The 'unclassified' files of a diff out of time, 'new' and 'old' files
+        alike, are counted only if there are any, without a percentage.
         """
-        return OrderedDict(
+        stats = OrderedDict(
             [
                 ("old_files_count", self.old_files_count),
                 ("new_files_count", self.new_files_count),
@@ -515,3 +703,7 @@ class Stat(object):
                 ("percent_unmodified", self.percent_unmodified),
             ]
         )
+        if self.num_unclassified:
+            stats["num_unclassified"] = self.num_unclassified
+        return stats
+
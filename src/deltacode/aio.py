@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+"""
+Run DeltaCode diffs from an asyncio event loop without blocking it: the
+loading, matching and scoring stages run in an executor, and the awaiting
+task can be cancelled between stages.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import asyncio
+import functools
+
+from deltacode import DeltaCode
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_options(new_path, old_path, all_delta_types=False):
+    """
+    Return the DeltaCode options of a diff of the scans at `new_path` and
+    `old_path`, as the command line would.
+    """
+    return OrderedDict([
+        ("--new", new_path),
+        ("--old", old_path),
+        ("--all-delta-types", all_delta_types),
+    ])
+
+
+async def run_in_executor(executor, function, *args):
+    """
+    Return the result of calling `function` with `args` in `executor`, or in
+    the default executor of the running loop if `executor` is None.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(function, *args))
+
+
+async def run_stages(new_path, old_path, options, executor):
+    """
+    Return the DeltaCode of the scans at `new_path` and `old_path`, running
+    each of its stages in `executor`.
+    """
+    deltacode = DeltaCode(new_path, old_path, options, lazy=True)
+    for stage in DeltaCode.STAGES:
+        await run_in_executor(executor, getattr(deltacode, stage))
+    return deltacode
+
+
+async def adiff(new_path, old_path, options=None, semaphore=None, executor=None):
+    """
+    Return the DeltaCode of the 'new' and 'old' scan files at `new_path` and
+    `old_path`, computed in `executor`, by default the executor of the
+    running loop.
+
+    If `semaphore` is provided, it is an asyncio.Semaphore shared by the
+    callers to cap the number of diffs running at once: the diff waits for
+    it before starting.
+
+    Cancelling the awaiting task stops the diff before its next stage; the
+    stage already running in the executor runs to completion and its result
+    is discarded.
+    """
+    if options is None:
+        options = get_options(new_path, old_path)
+    if semaphore is None:
+        return await run_stages(new_path, old_path, options, executor)
+    async with semaphore:
+        return await run_stages(new_path, old_path, options, executor)
+
+
+def next_batch(deltas, batch_size, all_delta_types=False):
+    """
+    Return a list of the next `batch_size` Delta objects of the `deltas`
+    iterator, omitting the unmodified files unless `all_delta_types` is True.
+    The list is shorter only when the iterator is exhausted.
+    """
+    batch = []
+    for delta in deltas:
+        if all_delta_types or delta.status != "unmodified":
+            batch.append(delta)
+            if len(batch) == batch_size:
+                break
+    return batch
+
+
+async def adiff_batches(new_path, old_path, options=None, all_delta_types=False,
+                        batch_size=DEFAULT_BATCH_SIZE, semaphore=None, executor=None):
+    """
+    Yield lists of at most `batch_size` scored Delta objects of the diff of
+    the scan files at `new_path` and `old_path`, omitting the unmodified
+    files unless `all_delta_types` is True.
+
+    The Delta objects are in the order of the matching of their files, not
+    ranked: each batch is matched and scored in `executor` as by
+    DeltaCode.iter_deltas() and yielded as soon as it is complete, while the
+    rest of the files are not matched yet.
+
+    The `semaphore` is held from the loading of the scans until the last
+    batch is yielded.
+    """
+    if options is None:
+        options = get_options(new_path, old_path, all_delta_types)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+    async with semaphore:
+        deltacode = DeltaCode(new_path, old_path, options, lazy=True)
+        await run_in_executor(executor, deltacode.load)
+        deltas = deltacode.iter_deltas()
+        while True:
+            batch = await run_in_executor(
+                executor, next_batch, deltas, batch_size, all_delta_types)
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                break
@@ -0,0 +1,267 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+"""
+Find the baseline scans closest to a scan in an index of MinHash sketches of
+the sha1 and path sets of the baseline scans, without comparing the scans
+themselves.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import hashlib
+import heapq
+import json
+import os
+
+import click
+from commoncode import paths
+
+from deltacode import DeltaCode
+from deltacode import __version__
+from deltacode.output import write_json
+from deltacode.utils import open_input
+from deltacode.utils import open_output
+
+# the number of values of a MinHash sketch: the standard error of a Jaccard
+# similarity estimate is about 1 / sqrt(SKETCH_SIZE)
+SKETCH_SIZE = 256
+
+
+def sketch(hashes, size=SKETCH_SIZE):
+    """
+    Return the bottom-k MinHash sketch of a set of 64-bit integer `hashes`:
+    the sorted list of its `size` smallest hashes, computed with a single
+    hash function instead of one per sketch value.
+    """
+    return heapq.nsmallest(size, set(hashes))
+
+
+def similarity(sketch1, sketch2, size=SKETCH_SIZE):
+    """
+    Return the estimated Jaccard similarity of the sets of two MinHash
+    sketches: the fraction of the `size` smallest hashes of their union that
+    are in both sketches, or 0 for an empty set. The estimate is exact for
+    sets with fewer than `size` elements.
+    """
+    if not sketch1 or not sketch2:
+        return 0.0
+    set1 = set(sketch1)
+    set2 = set(sketch2)
+    union = heapq.nsmallest(size, set1 | set2)
+    same = sum(1 for value in union if value in set1 and value in set2)
+    return same / len(union)
+
+
+def hash_sha1(sha1):
+    """
+    Return a 64-bit integer hash of a hex `sha1` string, its first 16 hex
+    digits: a sha1 is uniformly distributed already.
+    """
+    return int(sha1[:16], 16)
+
+
+def hash_path(path):
+    """
+    Return a 64-bit integer hash of a `path` string.
+    """
+    return int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def iter_scan_files(location):
+    """
+    Yield a tuple of (path without the root directory, sha1) for each file
+    of the ScanCode JSON scan at `location`, possibly compressed.
+    """
+    with open_input(location, "rt") as f:
+        scan = json.load(f)
+    for resource in scan.get("files", []):
+        if resource.get("type", "file") != "file":
+            continue
+        segments = paths.split(resource.get("path", ""))
+        # the root directory is named after each release
+        yield "/".join(segments[1:] or segments), resource.get("sha1")
+
+
+def get_sketches(location, size=SKETCH_SIZE):
+    """
+    Return an OrderedDict with the files count and the MinHash sketches of
+    the sha1 set and of the path set of the scan at `location`.
+    """
+    sha1s = set()
+    scan_paths = set()
+    files_count = 0
+    for path, sha1 in iter_scan_files(location):
+        files_count += 1
+        scan_paths.add(hash_path(path))
+        if sha1:
+            sha1s.add(hash_sha1(sha1))
+    return OrderedDict([
+        ("files_count", files_count),
+        ("sha1_sketch", sketch(sha1s, size)),
+        ("path_sketch", sketch(scan_paths, size)),
+    ])
+
+
+class BaselineIndex(object):
+    """
+    An index of the MinHash sketches of baseline scans, keyed by the
+    absolute path of each scan.
+    """
+
+    def __init__(self, sketch_size=SKETCH_SIZE):
+        self.sketch_size = sketch_size
+        self.baselines = OrderedDict()
+
+    def add(self, location):
+        """
+        Add or replace the sketches of the scan at `location`.
+        """
+        entry = get_sketches(location, self.sketch_size)
+        self.baselines[os.path.abspath(location)] = entry
+        return entry
+
+    def query(self, location, top=None):
+        """
+        Return a list of (baseline path, sha1 similarity, path similarity)
+        tuples for the `top` baselines closest to the scan at `location`,
+        ranked by the estimated Jaccard similarity of their sha1 sets, then
+        of their path sets.
+        """
+        size = self.sketch_size
+        sketches = get_sketches(location, size)
+        ranked = sorted(
+            (
+                (
+                    path,
+                    similarity(sketches["sha1_sketch"], entry["sha1_sketch"], size),
+                    similarity(sketches["path_sketch"], entry["path_sketch"], size),
+                )
+                for path, entry in self.baselines.items()
+            ),
+            key=lambda result: (result[1], result[2]),
+            reverse=True,
+        )
+        return ranked[:top] if top else ranked
+
+    def to_dict(self):
+        baselines = [
+            OrderedDict([("path", path)] + list(entry.items()))
+            for path, entry in self.baselines.items()
+        ]
+        return OrderedDict([
+            ("deltacode_version", __version__),
+            ("sketch_size", self.sketch_size),
+            ("baselines", baselines),
+        ])
+
+    def save(self, location):
+        """
+        Write the index to a JSON file at `location`, compressed after its
+        extension.
+        """
+        with open_output(location) as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, location):
+        """
+        Return the BaselineIndex of the JSON file at `location`.
+        """
+        with open_input(location, "rt") as f:
+            data = json.load(f)
+        index = cls(data["sketch_size"])
+        for baseline in data["baselines"]:
+            baseline = OrderedDict(baseline)
+            index.baselines[baseline.pop("path")] = baseline
+        return index
+
+
+@click.group()
+@click.help_option('-h', '--help')
+def cli():
+    """
+    Index baseline scans and find the baselines closest to a scan by the
+    estimated Jaccard similarity of their file sha1 and path sets.
+    """
+
+
+@cli.command()
+@click.help_option('-h', '--help')
+@click.option('-i', '--index', 'index_file', required=True, type=click.Path(dir_okay=False, writable=True), help='Identify the path to the index file, created if it does not exist')
+@click.option('--sketch-size', default=SKETCH_SIZE, show_default=True, type=click.IntRange(min=1), help='Number of hashes of the sketches of a new index')
+@click.argument('scans', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, readable=True))
+def index(index_file, sketch_size, scans):
+    """
+    Add the MinHash sketches of the SCANS baseline scan files to an index,
+    replacing the sketches of a scan already indexed.
+    """
+    if os.path.exists(index_file):
+        baseline_index = BaselineIndex.load(index_file)
+    else:
+        baseline_index = BaselineIndex(sketch_size)
+    for scan in scans:
+        entry = baseline_index.add(scan)
+        click.echo('Indexed {} files of {}'.format(entry["files_count"], scan))
+    baseline_index.save(index_file)
+
+
+@cli.command()
+@click.help_option('-h', '--help')
+@click.option('-i', '--index', 'index_file', required=True, type=click.Path(exists=True, dir_okay=False, readable=True), help='Identify the path to the index file')
+@click.option('-t', '--top', default=10, show_default=True, type=click.IntRange(min=1), help='Number of closest baselines to list')
+@click.option('-j', '--json-file', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Run a full diff of the scan against the closest baseline and write the JSON results to this file')
+@click.option('-a', '--all-delta-types', is_flag=True, help='Include unmodified files in the JSON results of the full diff')
+@click.argument('scan', type=click.Path(exists=True, dir_okay=False, readable=True))
+def query(index_file, top, json_file, all_delta_types, scan):
+    """
+    List the indexed baselines closest to the SCAN scan file, by estimated
+    Jaccard similarity of their file sha1 sets, then of their file path
+    sets.  With -j, run a full diff against the closest baseline, the 'old'
+    scan of the diff.
+    """
+    baseline_index = BaselineIndex.load(index_file)
+    ranked = baseline_index.query(scan, top)
+    click.echo('{:>6} {:>6}  {}'.format('sha1', 'paths', 'baseline'), err=bool(json_file))
+    for path, sha1_similarity, path_similarity in ranked:
+        click.echo('{:>6.2f} {:>6.2f}  {}'.format(sha1_similarity, path_similarity, path), err=bool(json_file))
+
+    if not json_file:
+        return
+    if not ranked:
+        raise click.UsageError('The index has no baselines.')
+    best = ranked[0][0]
+    options = OrderedDict([
+        ('--new', scan),
+        ('--old', best),
+        ('--all-delta-types', all_delta_types)
+    ])
+    deltacode = DeltaCode(scan, best, options)
+    if json_file == '-':
+        write_json(deltacode, click.open_file('-', mode='w'), all_delta_types)
+    else:
+        with open_output(json_file) as outfile:
+            write_json(deltacode, outfile, all_delta_types)
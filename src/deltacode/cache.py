@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+from deltacode import __version__
+from deltacode.utils import open_input
+
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+CACHE_EXTENSION = ".json"
+
+
+def content_hash(location, chunk_size=1024 * 1024):
+    """
+    Return the sha256 hex digest of the content of the file at `location`,
+    decompressed if it is compressed.
+    """
+    sha256 = hashlib.sha256()
+    with open_input(location, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_umask():
+    """
+    Return the file mode creation mask of the current process.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class ResultCache(object):
+    """
+    A content-addressed cache of DeltaCode results in a `directory`, with one
+    file per result named after its key.
+
+    Each result is written to a temporary file renamed to its final name when
+    complete, so concurrent processes never see a partial result. When the
+    total size of the results goes over `max_size` bytes, the least recently
+    used ones are deleted.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, new_path, old_path, options):
+        """
+        Return the cache key of the results of the 'new' and 'old' scans at
+        `new_path` and `old_path` with the JSON-serializable `options` that
+        affect the results, for this DeltaCode version.
+        """
+        key = json.dumps(
+            [__version__, content_hash(new_path), content_hash(old_path), options],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_location(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def get(self, key):
+        """
+        Return a text file object to read the cached results with `key` or
+        None if there are no such results.
+        """
+        location = self.get_location(key)
+        try:
+            cached = io.open(location, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        try:
+            # the modification time is the last use time
+            os.utime(location)
+        except OSError:
+            pass
+        return cached
+
+    @contextmanager
+    def writer(self, key):
+        """
+        Return a context manager for a text file object to write the results
+        with `key` to, readable as well.  The results are added to the cache
+        only if the context exits without an exception.
+        """
+        fd, temp_location = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        try:
+            with io.open(fd, "w+", encoding="utf-8") as cache_file:
+                yield cache_file
+            # mkstemp creates the file readable only by its owner
+            os.chmod(temp_location, 0o666 & ~get_umask())
+            os.replace(temp_location, self.get_location(key))
+        except BaseException:
+            if os.path.exists(temp_location):
+                os.remove(temp_location)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used results until their total size is not
+        over the maximum size of the cache.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_EXTENSION):
+                continue
+            location = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(location)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, location))
+
+        size = sum(entry[1] for entry in entries)
+        for _mtime, entry_size, location in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(location)
+            except FileNotFoundError:
+                # deleted by another process
+                pass
+            size -= entry_size
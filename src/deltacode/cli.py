@@ -26,37 +26,32 @@
 from __future__ import absolute_import
 
 from collections import OrderedDict
+import shutil
 
 import click
 import simplejson
 
 from deltacode import DeltaCode
+from deltacode import get_stats
+from deltacode import load_codebases
 from deltacode import __version__
-from deltacode.utils import deltas, get_notice, collect_errors
-
-
-def write_json(deltacode, outfile, all_delta_types=False):
-    """
-    Using the DeltaCode object, create a .json file containing the primary
-    information from the Delta objects.  Through a call to utils.deltas(), omit
-    all unmodified Delta objects -- identified by a 'score' of 0 -- unless the
-    user selects the '-a'/'--all-delta-types' option.
-    """
-    results = OrderedDict([
-        ('deltacode_notice', get_notice()),
-        ('new_scan_options', deltacode.new_scan_options),
-        ('old_scan_options', deltacode.old_scan_options),
-        ('deltacode_options', deltacode.options),
-        ('deltacode_version', __version__),
-        ('deltacode_errors', collect_errors(deltacode)),
-        ('deltas_count', len([d for d in deltas(deltacode, all_delta_types)])),
-        ('delta_stats', deltacode.stats.to_dict()),
-        ('deltas', deltas(deltacode, all_delta_types))
-    ])
-
-    # TODO: add toggle for pretty printing
-    simplejson.dump(results, outfile, iterable_as_array=True, indent=2)
-    outfile.write('\n')
+from deltacode.cache import DEFAULT_CACHE_SIZE
+from deltacode.cache import ResultCache
+from deltacode.output import copy_json
+from deltacode.output import has_msgpack
+from deltacode.output import has_pyarrow
+from deltacode.output import write_arrow
+from deltacode.output import write_csv
+from deltacode.output import write_json
+from deltacode.output import write_json_lines
+from deltacode.output import write_msgpack
+from deltacode.output import write_sqlite
+from deltacode.output import write_stats_json
+from deltacode.utils import get_extension_compression
+from deltacode.utils import has_zstandard
+from deltacode.utils import open_compressed
+from deltacode.utils import open_output
+from deltacode.utils import parse_fields
 
 
 def print_version(ctx, param, value):
@@ -66,21 +61,124 @@ def print_version(ctx, param, value):
     ctx.exit()
 
 
+def validate_fields(ctx, param, value):
+    """
+    Return the (delta fields, file fields) selected by the '--fields' option
+    or None if the option is not used.
+    """
+    try:
+        return parse_fields(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def open_output_file(location, mode, compression):
+    """
+    Return a file object to write an output to `location` in `mode`, 'w' or
+    'wb', compressed with `compression` or with the compression matching the
+    file extension, and closed when the command ends.  A `location` of '-'
+    is the standard output.
+    """
+    if location is None:
+        return
+    ctx = click.get_current_context()
+    if location == '-':
+        if not compression:
+            return click.open_file('-', mode=mode)
+        stdout = click.get_binary_stream('stdout')
+        output_file = open_compressed(stdout, mode if 'b' in mode else 'wt', compression)
+    else:
+        output_file = open_output(location, mode, compression)
+    ctx.call_on_close(output_file.close)
+    return output_file
+
+
+def is_failing_delta(delta, fail_on_score=None, fail_on_factors=()):
+    """
+    Return True if the `delta` Delta object fails the CI gate: if its score
+    is at least `fail_on_score` or if one of its factors starts with one of
+    the `fail_on_factors` strings, ignoring case.
+    """
+    if fail_on_score is not None and delta.score >= fail_on_score:
+        return True
+    factors = [factor.lower() for factor in delta.factors]
+    return any(
+        factor.startswith(fail_on_factor.lower())
+        for fail_on_factor in fail_on_factors
+        for factor in factors
+    )
+
+
+def echo_failing_delta(deltacode, delta):
+    """
+    Print the JSON of a failing `delta` of a `deltacode` to stderr.
+    """
+    click.echo('The diff fails on the delta:', err=True)
+    click.echo(simplejson.dumps(delta.to_dict(deltacode), indent=2), err=True)
+
+
 @click.command()
 @click.help_option('-h', '--help')
 @click.option('--version', is_flag=True, is_eager=True, expose_value=False, callback=print_version, help='Show the version and exit.')
 @click.option('-n', '--new', required=True, prompt=False, type=click.Path(exists=True, readable=True), help='Identify the path to the "new" scan file')
 @click.option('-o', '--old', required=True, prompt=False, type=click.Path(exists=True, readable=True), help='Identify the path to the "old" scan file')
-@click.option('-j', '--json-file', prompt=False, default='-', type=click.File(mode='w', lazy=False), help='Identify the path to the .json output file')
+@click.option('-j', '--json-file', prompt=False, type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to the .json output file')
+@click.option('--json-lines', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to a JSON Lines output file: a header line with the stats followed by one line per delta, in ranked order, written once all the deltas are scored and ranked')
+@click.option('--csv', 'csv_file', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to the .csv output file')
+@click.option('--parquet', type=click.Path(dir_okay=False, writable=True), help='Identify the path to a Parquet output file (requires pyarrow)')
+@click.option('--arrow', type=click.Path(dir_okay=False, writable=True), help='Identify the path to an Arrow IPC output file (requires pyarrow)')
+@click.option('--sqlite', type=click.Path(dir_okay=False, writable=True), help='Identify the path to a SQLite database output file')
+@click.option('--msgpack', 'msgpack_file', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to a length-prefixed MessagePack frames output file (requires msgpack)')
+@click.option('--compress', type=click.Choice(['gzip', 'xz', 'zstd']), help='Compress the JSON, JSON Lines, CSV and MessagePack outputs. By default, outputs with a .gz, .xz or .zst extension are compressed accordingly.')
+@click.option('--dictionary-encode', is_flag=True, help='Write top-level "licenses" and "copyrights" tables in the JSON and JSON Lines outputs and refer to their entries by index in each file.')
+@click.option('--changed-fields-only', is_flag=True, help='In the JSON and JSON Lines outputs, write only the path and the fields that differ from the "new" file for the "old" file of a modified, moved or unmodified file.')
+@click.option('--fields', callback=validate_fields, metavar='FIELD,...', help='In the JSON, JSON Lines and MessagePack outputs, write only these comma-separated delta fields (status, factors, score, new, old) and file fields (path, type, name, size, sha1, fingerprint, original_path, licenses, copyrights).')
+@click.option('--stats-only', is_flag=True, help='Only compute the "delta_stats" counts and percentages, without creating and scoring the deltas, and write them to the JSON output.')
+@click.option('--cache-dir', type=click.Path(file_okay=False, writable=True), help='Reuse the JSON results of an identical comparison cached in this directory, and cache the new results there.')
+@click.option('--cache-size', default=DEFAULT_CACHE_SIZE // (1024 * 1024), show_default=True, type=click.IntRange(min=0), help='Maximum size in MB of the results cached in the --cache-dir directory.')
+@click.option('--fail-on-score', type=click.IntRange(min=1), metavar='N', help='Exit with a return code of 1 if a delta has a score of at least N.')
+@click.option('--fail-on-factor', 'fail_on_factors', multiple=True, metavar='FACTOR', help='Exit with a return code of 1 if a delta has a factor starting with FACTOR, ignoring case, e.g., "copyleft added". Can be repeated.')
+@click.option('--fail-fast', is_flag=True, help='With --fail-on-score or --fail-on-factor, stop matching and scoring files at the first failing delta, print it and exit without writing any output.')
+@click.option('--time-budget', type=click.FloatRange(min=0, min_open=True), metavar='SECONDS', help='Stop matching and scoring files after SECONDS seconds: the files left to match are "unclassified", the deltas left to score keep their base score and the truncated stages are reported in the outputs.')
 @click.option('-a', '--all-delta-types', is_flag=True, help="Include unmodified files as well as all changed files in the .json output.  If not selected, only changed files are included.")
-def cli(new, old, json_file, all_delta_types):
+def cli(new, old, json_file, json_lines, csv_file, parquet, arrow, sqlite, msgpack_file,
+        compress, dictionary_encode, changed_fields_only, fields, stats_only,
+        cache_dir, cache_size, fail_on_score, fail_on_factors, fail_fast, time_budget,
+        all_delta_types):
     """
     Identify the changes that need to be made to the 'old'
     scan file (-o or --old) in order to generate the 'new' scan file (-n or
-    --new).  Write the results to a .json file (-j or --json-file) at a
-    user-designated location.  If no file option is selected, print the JSON
-    results to the console.
+    --new).  Write the results to a .json file (-j or --json-file) and/or to
+    the other output file options at a user-designated location.  If no file
+    option is selected, print the JSON results to the console.
     """
+    if (parquet or arrow) and not has_pyarrow():
+        raise click.UsageError('The --parquet and --arrow options require the pyarrow package.')
+    if msgpack_file and not has_msgpack():
+        raise click.UsageError('The --msgpack option requires the msgpack package.')
+    if stats_only and (json_lines or csv_file or parquet or arrow or sqlite or msgpack_file):
+        raise click.UsageError('The --stats-only option only writes the JSON output.')
+    if cache_dir and (json_lines or csv_file or parquet or arrow or sqlite or msgpack_file):
+        raise click.UsageError('The --cache-dir option only applies to the JSON output.')
+    fail_on = fail_on_score is not None or fail_on_factors
+    if fail_on and (stats_only or cache_dir):
+        raise click.UsageError('The --fail-on-score and --fail-on-factor options do not apply to the --stats-only and --cache-dir options.')
+    if time_budget and (stats_only or cache_dir):
+        raise click.UsageError('The --time-budget option does not apply to the --stats-only and --cache-dir options.')
+    if fail_fast and not fail_on:
+        raise click.UsageError('The --fail-fast option requires the --fail-on-score or --fail-on-factor option.')
+    output_files = [json_file, json_lines, csv_file, msgpack_file]
+    compressions = [compress] + [get_extension_compression(f) for f in output_files if f]
+    if 'zstd' in compressions and not has_zstandard():
+        raise click.UsageError('zstd compressed outputs require the zstandard package.')
+
+    if not (json_file or json_lines or csv_file or parquet or arrow or sqlite or msgpack_file):
+        json_file = '-'
+    json_file = open_output_file(json_file, 'w', compress)
+    json_lines = open_output_file(json_lines, 'w', compress)
+    csv_file = open_output_file(csv_file, 'wb', compress)
+    msgpack_file = open_output_file(msgpack_file, 'wb', compress)
+
     # retrieve the option selections
     options = OrderedDict([
         ('--new', new),
@@ -88,7 +186,64 @@ def cli(new, old, json_file, all_delta_types):
         ('--all-delta-types', all_delta_types)
     ])
 
+    if stats_only:
+        def write_results(outfile):
+            write_stats_json(get_stats(*load_codebases(new, old)), outfile, options)
+    else:
+        def write_results(outfile):
+            deltacode = DeltaCode(new, old, options)
+            write_json(deltacode, outfile, all_delta_types, dictionary_encode, changed_fields_only, fields)
+
+    if cache_dir:
+        cache = ResultCache(cache_dir, cache_size * 1024 * 1024)
+        # the content hashes of the key stand for the --new and --old paths,
+        # which are replaced in the cached results on a hit
+        key_options = OrderedDict((option, value) for option, value in options.items()
+                                  if option not in ('--new', '--old'))
+        key = cache.get_key(new, old, [key_options, dictionary_encode, changed_fields_only, fields, stats_only])
+        cached = cache.get(key)
+        if cached:
+            with cached:
+                copy_json(cached, json_file, options)
+            return
+        with cache.writer(key) as cache_file:
+            write_results(cache_file)
+            cache_file.seek(0)
+            shutil.copyfileobj(cache_file, json_file)
+        return
+
+    if stats_only:
+        write_results(json_file)
+        return
+
     # do the delta
-    deltacode = DeltaCode(new, old, options)
+    if fail_fast:
+        deltacode = DeltaCode(new, old, options, lazy=True, time_budget=time_budget)
+        for delta in deltacode.iter_deltas():
+            if is_failing_delta(delta, fail_on_score, fail_on_factors):
+                echo_failing_delta(deltacode, delta)
+                click.get_current_context().exit(1)
+        deltacode.rank()
+    else:
+        deltacode = DeltaCode(new, old, options, time_budget=time_budget)
     # generate JSON output
-    write_json(deltacode, json_file, all_delta_types)
+    if json_file:
+        write_json(deltacode, json_file, all_delta_types, dictionary_encode, changed_fields_only, fields)
+    if json_lines:
+        write_json_lines(deltacode, json_lines, all_delta_types, dictionary_encode, changed_fields_only, fields)
+    if csv_file:
+        write_csv(deltacode, csv_file, all_delta_types)
+    if parquet:
+        write_arrow(deltacode, parquet, all_delta_types, file_format='parquet')
+    if arrow:
+        write_arrow(deltacode, arrow, all_delta_types, file_format='arrow')
+    if sqlite:
+        write_sqlite(deltacode, sqlite, all_delta_types)
+    if msgpack_file:
+        write_msgpack(deltacode, msgpack_file, all_delta_types, fields)
+
+    if fail_on:
+        failing = [d for d in deltacode.deltas if is_failing_delta(d, fail_on_score, fail_on_factors)]
+        if failing:
+            click.echo('Failing deltas: {}'.format(len(failing)), err=True)
+            click.get_current_context().exit(1)
@@ -0,0 +1,600 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+"""
+Compose two DeltaCode JSON outputs, from a scan A to a scan B and from the
+scan B to a scan C, into the DeltaCode JSON output from A to C without the
+scans.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from collections import defaultdict
+from collections import deque
+import heapq
+
+import click
+from commoncode import paths
+from commoncode.resource import clean_path
+
+from deltacode import Delta
+from deltacode import Stat
+from deltacode import UNIQUE_LICENSE_CATEGORIES
+from deltacode import __version__
+from deltacode import score_delta
+from deltacode.output import JsonDeltaEncoder
+from deltacode.output import write_json_document
+from deltacode.utils import CategoryMasks
+from deltacode.utils import aligned_path
+from deltacode.utils import expand_delta
+from deltacode.utils import get_notice
+from deltacode.utils import iter_json_deltas
+from deltacode.utils import open_output
+
+# the initial score of a Delta by status, before the license, copyright and
+# similarity scoring
+STATUS_SCORES = {"added": 100, "modified": 20}
+
+
+class ComposeError(Exception):
+    """
+    Raised for DeltaCode outputs that cannot be composed.
+    """
+
+    pass
+
+
+def clean_entries(entries):
+    """
+    Return a list of license or copyright mappings read from a DeltaCode
+    output without their null values, i.e., the fields missing in the scan.
+    """
+    return [
+        OrderedDict((key, value) for key, value in entry.items() if value is not None)
+        for entry in entries or []
+    ]
+
+
+class OutputFile(object):
+    """
+    A 'new' or 'old' file of a DeltaCode JSON output with the attributes of
+    a scan resource used to match and score it: `path` is its original path
+    in its scan and `aligned_path` is this path without the first `offset`
+    segments.
+    """
+
+    __slots__ = (
+        "path",
+        "aligned_path",
+        "type",
+        "name",
+        "size",
+        "sha1",
+        "fingerprint",
+        "licenses",
+        "copyrights",
+    )
+
+    def __init__(self, data, offset, path=None):
+        self.path = path or data["original_path"]
+        self.aligned_path = aligned_path(self.path, offset)
+        self.type = data["type"]
+        self.name = data["name"]
+        self.size = data["size"]
+        self.sha1 = data["sha1"]
+        # a resource without fingerprint is written with an empty one
+        if data["fingerprint"] != "":
+            self.fingerprint = data["fingerprint"]
+        self.licenses = clean_entries(data["licenses"])
+        self.copyrights = clean_entries(data["copyrights"])
+
+
+def walk_key(path):
+    """
+    Return a key to sort the file paths of a codebase in the order of a
+    codebase walk: directories after files and each level by case-insensitive
+    name.
+    """
+    segments = paths.split(path)
+    last = len(segments) - 1
+    return tuple((i != last, segment.lower(), segment) for i, segment in enumerate(segments))
+
+
+def delta_key(delta):
+    """
+    Return a key to sort Delta objects in the order DeltaCode creates them:
+    the 'new' files in walk order, then the 'removed' files in walk order.
+    """
+    if delta.new_file:
+        return False, walk_key(delta.new_file.path)
+    return True, walk_key(delta.old_file.path)
+
+
+def iter_deltas(location, headers):
+    """
+    Yield the full delta mappings of the DeltaCode output at `location`,
+    updating the `headers` mapping with its top-level results.
+    """
+    for delta in iter_json_deltas(location, headers):
+        if delta is None:
+            raise ComposeError(
+                "{} must be a DeltaCode output with all delta types (-a).".format(location)
+            )
+        yield expand_delta(delta, headers)
+
+
+def get_offset(file):
+    """
+    Return the number of leading segments removed by the tree alignment from
+    the original path of a 'new' or 'old' `file` mapping.
+    """
+    return len(paths.split(file["original_path"])) - len(paths.split(file["path"]))
+
+
+def get_alignment(deltas):
+    """
+    Return a tuple of (new offset, old offset, new original path, old
+    original path) for the `deltas` mappings of a DeltaCode output from its
+    first 'new' and 'old' files with an aligned path.  The paths of a missing
+    side are None.
+    """
+    new_offset = old_offset = 0
+    new_path = old_path = None
+    for delta in deltas:
+        new, old = delta["new"], delta["old"]
+        if new and new["path"] and new_path is None:
+            new_offset, new_path = get_offset(new), new["original_path"]
+        if old and old["path"] and old_path is None:
+            old_offset, old_path = get_offset(old), old["original_path"]
+        if new_path is not None and old_path is not None:
+            break
+    return new_offset, old_offset, new_path, old_path
+
+
+def compose_offsets(first_alignment, second_alignment):
+    """
+    Return a tuple of the (C offset, A offset) that align the trees of the
+    scans C and A given the alignments of the DeltaCode outputs from A to B
+    and from B to C, as utils.align_trees() aligns them: without the leading
+    segments that are the same in both trees.
+    """
+    middle_offset, first_offset, _, first_path = first_alignment
+    last_offset, second_offset, last_path, _ = second_alignment
+    if first_path is None or last_path is None:
+        return 0, 0
+    # the trees of A and C are aligned on the paths of B without the
+    # segments removed by either alignment
+    offset = max(middle_offset, second_offset)
+    first_offset += offset - middle_offset
+    last_offset += offset - second_offset
+
+    first_segments = paths.split(first_path)[:first_offset]
+    last_segments = paths.split(last_path)[:last_offset]
+    while (
+        first_offset and last_offset
+        and first_segments[first_offset - 1] == last_segments[last_offset - 1]
+    ):
+        first_offset -= 1
+        last_offset -= 1
+    if first_segments == last_segments:
+        return 0, 0
+    return last_offset, first_offset
+
+
+def get_status(old_file, new_file):
+    """
+    Return the status of the Delta between an `old_file` and a `new_file`
+    OutputFile, or None if they do not match.
+    """
+    if old_file.aligned_path == new_file.aligned_path:
+        return "unmodified" if old_file.sha1 == new_file.sha1 else "modified"
+    if old_file.sha1 == new_file.sha1:
+        return "moved"
+
+
+def create_delta(status, new_file, old_file, category_masks=None):
+    """
+    Return a scored Delta with `status` for a `new_file` and an `old_file`
+    OutputFile, sharing the `category_masks` CategoryMasks if provided.
+    """
+    delta = Delta(STATUS_SCORES.get(status, 0), new_file, old_file)
+    delta.status = status
+    delta.new_path = new_file.aligned_path if new_file else None
+    delta.old_path = old_file.aligned_path if old_file else None
+    if status != "unmodified":
+        score_delta(delta, category_masks)
+    return delta
+
+
+def match_files(new_files, old_files):
+    """
+    Yield a tuple of (status, new file, old file) for the unmatched 'new' and
+    'old' OutputFiles as utils.match_resources() matches them: each 'new'
+    file in walk order matches the 'old' file with its aligned path as an
+    original path and the same sha1, matched or not, or else the first
+    unmatched 'old' file in walk order with the same aligned path or the same
+    sha1. The others are 'added' or 'removed'.
+    """
+    new_files = sorted(new_files, key=lambda f: walk_key(f.path))
+    old_files = sorted(old_files, key=lambda f: walk_key(f.path))
+    by_path = defaultdict(deque)
+    by_sha1 = defaultdict(deque)
+    by_original_path = {}
+    for index, old_file in enumerate(old_files):
+        by_path[old_file.aligned_path].append(index)
+        by_sha1[old_file.sha1].append(index)
+        by_original_path[old_file.path] = index
+    matched = set()
+
+    def first_unmatched(indexes):
+        while indexes and indexes[0] in matched:
+            indexes.popleft()
+        if indexes:
+            return indexes[0]
+
+    for new_file in new_files:
+        # the aligned path is looked up as an original path, as DeltaCode
+        # does, even if matched to a previous 'new' file
+        index = by_original_path.get(clean_path(new_file.aligned_path))
+        if index is not None and old_files[index].sha1 == new_file.sha1:
+            matched.add(index)
+            yield "unmodified", new_file, old_files[index]
+            continue
+
+        candidates = [
+            index
+            for index in (
+                first_unmatched(by_path.get(new_file.aligned_path)),
+                first_unmatched(by_sha1.get(new_file.sha1)),
+            )
+            if index is not None
+        ]
+        if not candidates:
+            yield "added", new_file, None
+            continue
+        index = min(candidates)
+        matched.add(index)
+        yield get_status(old_files[index], new_file), new_file, old_files[index]
+
+    for index, old_file in enumerate(old_files):
+        if index not in matched:
+            yield "removed", None, old_file
+
+
+def check_all_delta_types(location, headers):
+    """
+    Raise a ComposeError if the DeltaCode output at `location` with `headers`
+    was not created with all the delta types.
+    """
+    if not headers.get("deltacode_options", {}).get("--all-delta-types"):
+        raise ComposeError(
+            "{} must be a DeltaCode output with all delta types (-a).".format(location)
+        )
+
+
+class Composer(object):
+    """
+    Compose a `first` DeltaCode JSON output from A to B and a `second` one
+    from B to C, both with all delta types, into the deltas from A to C.
+
+    The files of B are matched by their original path. Only the files changed
+    from A to B or from B to C are kept in memory: the A file of a file
+    unmodified from A to B is derived from its B file, and the files
+    unmodified from A to C are streamed from the second output when written.
+    """
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+        self.first_headers = OrderedDict()
+        self.second_headers = OrderedDict()
+
+        # the alignment is found from the first files of each output
+        self.first_alignment = get_alignment(iter_deltas(first, OrderedDict()))
+        self.second_alignment = get_alignment(iter_deltas(second, OrderedDict()))
+        self.last_offset, self.first_offset = compose_offsets(
+            self.first_alignment, self.second_alignment
+        )
+
+        # mapping of {B original path: A OutputFile or None if added} for the
+        # files changed from A to B
+        self.changed = {}
+        # the A OutputFiles removed from A to B
+        self.removed = []
+        # the B original paths of the files unmodified from A to C matched
+        # again with the changed files
+        self.rematched = set()
+        self.deltas = []
+        self.unmodified_count = 0
+        self.has_licenses = False
+        self.has_copyrights = False
+
+    def derive_first_file(self, middle_file):
+        """
+        Return the A OutputFile of a file unmodified from A to B given its B
+        `middle_file` mapping.
+        """
+        middle_offset, old_offset, _, first_path = self.first_alignment
+        segments = (
+            paths.split(first_path)[:old_offset]
+            + paths.split(middle_file["original_path"])[middle_offset:]
+        )
+        return OutputFile(middle_file, self.first_offset, "/".join(segments))
+
+    def read_first(self):
+        """
+        Index the files changed and removed from A to B.
+        """
+        for delta in iter_deltas(self.first, self.first_headers):
+            self.check_license_fields(delta)
+            new, old = delta["new"], delta["old"]
+            status = delta["status"]
+            if status == "unmodified" and new["path"] == old["path"]:
+                continue
+            if status == "removed":
+                self.removed.append(OutputFile(old, self.first_offset))
+            else:
+                self.changed[new["original_path"]] = old and OutputFile(old, self.first_offset)
+
+        check_all_delta_types(self.first, self.first_headers)
+
+    def get_first_file(self, middle_file):
+        """
+        Return a tuple of (changed, A OutputFile or None) for a B
+        `middle_file` mapping, where `changed` is True if it was changed from
+        A to B.
+        """
+        original_path = middle_file["original_path"]
+        if original_path in self.changed:
+            return True, self.changed[original_path]
+        return False, self.derive_first_file(middle_file)
+
+    def read_second(self):
+        """
+        Compose and score the deltas of the files changed from A to C and
+        count the unmodified ones.
+        """
+        new_files = []
+        # mapping of {A original path: A OutputFile} for the A files to match
+        # again with the other changed files
+        old_files = {}
+        # mapping of {A original path: (C OutputFile, A OutputFile)} for the
+        # files changed from A to B and unmodified from A to C
+        unmodified = {}
+        pairs = []
+        for delta in iter_deltas(self.second, self.second_headers):
+            self.check_license_fields(delta)
+            new, old = delta["new"], delta["old"]
+            new_file = new and OutputFile(new, self.last_offset)
+            if not old:
+                new_files.append(new_file)
+                continue
+
+            changed, old_file = self.get_first_file(old)
+            if not new_file:
+                # the files added then removed cancel out
+                if old_file:
+                    old_files[old_file.path] = old_file
+                continue
+            if not old_file:
+                new_files.append(new_file)
+                continue
+
+            status = get_status(old_file, new_file)
+            if status == "unmodified" and not changed:
+                # streamed from the second output when written
+                self.unmodified_count += 1
+            elif status == "unmodified":
+                unmodified[old_file.path] = new_file, old_file
+            else:
+                new_files.append(new_file)
+                old_files[old_file.path] = old_file
+
+        # DeltaCode matches a 'new' file to the 'old' file with the same path
+        # and sha1 even if this file was matched to a previous 'new' file,
+        # so an A file can be both unmodified and matched to another file:
+        # its unmodified C file is matched again with the changed files
+        for path, (new_file, old_file) in unmodified.items():
+            if path in old_files:
+                new_files.append(new_file)
+            else:
+                pairs.append(("unmodified", new_file, old_file))
+        if old_files:
+            for delta in iter_deltas(self.second, OrderedDict()):
+                matched = self.get_unmodified(delta)
+                if matched and matched.old_file.path in old_files:
+                    new_files.append(matched.new_file)
+                    self.unmodified_count -= 1
+                    self.rematched.add(delta["old"]["original_path"])
+
+        check_all_delta_types(self.second, self.second_headers)
+        middle_count = self.first_headers["delta_stats"]["new_files_count"]
+        if middle_count != self.second_headers["delta_stats"]["old_files_count"]:
+            raise ComposeError(
+                "The 'old' scan of {} is not the 'new' scan of {}.".format(self.second, self.first)
+            )
+
+        pairs.extend(match_files(new_files, self.removed + list(old_files.values())))
+        category_masks = CategoryMasks(UNIQUE_LICENSE_CATEGORIES)
+        for status, new_file, old_file in pairs:
+            if new_file:
+                # a scan resource without license or copyright data is
+                # scored differently from one with empty data
+                if not self.has_licenses:
+                    del new_file.licenses
+                if not self.has_copyrights:
+                    del new_file.copyrights
+            self.deltas.append(create_delta(status, new_file, old_file, category_masks))
+
+        # Sort as DeltaCode does: in creation order, then by factors,
+        # alphabetically, and by score, descending, i.e., high > low.
+        self.deltas.sort(key=delta_key)
+        self.deltas.sort(key=lambda delta: delta.factors)
+        self.deltas.sort(key=lambda delta: delta.score, reverse=True)
+
+    def check_license_fields(self, delta):
+        """
+        Record if the B or C scans have license and copyright data from the
+        'new' file and the factors of a `delta` mapping: a file unmodified
+        from B to C has the data of B.
+        """
+        new = delta["new"]
+        if new:
+            self.has_licenses = self.has_licenses or bool(new["licenses"])
+            self.has_copyrights = self.has_copyrights or bool(new["copyrights"])
+        if "license info added" in delta["factors"]:
+            self.has_licenses = True
+        if "copyright info added" in delta["factors"]:
+            self.has_copyrights = True
+
+    def get_unmodified(self, delta):
+        """
+        Return an unmodified Delta object for a `delta` mapping of the second
+        output if its files are unmodified from A to B and from A to C, or
+        None.
+        """
+        new, old = delta["new"], delta["old"]
+        if not (new and old) or old["original_path"] in self.changed:
+            return
+        if old["original_path"] in self.rematched:
+            return
+        new_file = OutputFile(new, self.last_offset)
+        old_file = self.derive_first_file(old)
+        if get_status(old_file, new_file) == "unmodified":
+            return create_delta("unmodified", new_file, old_file)
+
+    def iter_unmodified(self):
+        """
+        Yield the unmodified Delta objects of the files unmodified from A to
+        B, in walk order, from another reading of the second output.
+        """
+        for delta in iter_deltas(self.second, OrderedDict()):
+            unmodified = self.get_unmodified(delta)
+            if unmodified:
+                yield unmodified
+
+    def iter_ranked(self):
+        """
+        Yield all the composed Delta objects in the DeltaCode output order.
+        The unmodified deltas are merged in walk order with the other deltas
+        that have a zero score and no factors, which are ranked last.
+        """
+        ranked = [delta for delta in self.deltas if delta.score or delta.factors]
+        unranked = [delta for delta in self.deltas if not (delta.score or delta.factors)]
+        for delta in ranked:
+            yield delta
+        for delta in heapq.merge(unranked, self.iter_unmodified(), key=delta_key):
+            yield delta
+
+    def get_stats(self):
+        """
+        Return the Stat of the composed deltas.
+        """
+        stats = Stat(
+            self.second_headers["delta_stats"]["new_files_count"],
+            self.first_headers["delta_stats"]["old_files_count"],
+        )
+        for delta in self.deltas:
+            stats.count(delta.status)
+        stats.num_unmodified += self.unmodified_count
+        stats.calculate_stats()
+        return stats
+
+    def get_headers(self):
+        """
+        Return an OrderedDict of the top-level results of the composed output.
+        """
+        first_options = self.first_headers.get("deltacode_options", {})
+        second_options = self.second_headers.get("deltacode_options", {})
+        new_scan_options = self.second_headers.get("new_scan_options", [])
+        # DeltaCode reads the 'old' scan options only if the 'new' scan has
+        # headers
+        old_scan_options = []
+        if new_scan_options != []:
+            old_scan_options = self.first_headers.get("old_scan_options", [])
+        return OrderedDict([
+            ('deltacode_notice', get_notice()),
+            ('new_scan_options', new_scan_options),
+            ('old_scan_options', old_scan_options),
+            ('deltacode_options', OrderedDict([
+                ('--new', second_options.get("--new")),
+                ('--old', first_options.get("--old")),
+                ('--all-delta-types', True),
+            ])),
+            ('deltacode_version', __version__),
+            ('deltacode_errors', (
+                self.first_headers.get("deltacode_errors", [])
+                + self.second_headers.get("deltacode_errors", [])
+            )),
+            ('deltas_count', len(self.deltas) + self.unmodified_count),
+            ('delta_stats', self.get_stats().to_dict()),
+        ])
+
+    def write_json(self, outfile):
+        """
+        Write the composed DeltaCode JSON output to the `outfile` text stream.
+        """
+        try:
+            self.read_first()
+            self.read_second()
+        except KeyError as e:
+            raise ComposeError("The DeltaCode outputs must have all the fields: {}".format(e))
+        encoder = JsonDeltaEncoder()
+        chunks = (encoder.encode_delta(delta, 2) for delta in self.iter_ranked())
+        write_json_document(outfile, self.get_headers(), encoder, chunks)
+
+
+def compose(first, second, outfile):
+    """
+    Write to the `outfile` text stream the DeltaCode JSON output from A to C
+    composed from the `first` DeltaCode JSON output from A to B and the
+    `second` one from B to C, both created with all the delta types.
+    """
+    Composer(first, second).write_json(outfile)
+
+
+@click.command()
+@click.help_option('-h', '--help')
+@click.option('-f', '--first', required=True, type=click.Path(exists=True, dir_okay=False, readable=True), help='Identify the path to the DeltaCode JSON output from a scan A to a scan B')
+@click.option('-s', '--second', required=True, type=click.Path(exists=True, dir_okay=False, readable=True), help='Identify the path to the DeltaCode JSON output from the scan B to a scan C')
+@click.option('-j', '--json-file', default='-', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to the .json output file from A to C')
+def cli(first, second, json_file):
+    """
+    Compose two DeltaCode JSON or JSON Lines outputs created with the
+    -a/--all-delta-types option, from a scan A to a scan B (-f or --first)
+    and from the scan B to a scan C (-s or --second), into the DeltaCode JSON
+    output from A to C, without the scans.  If no .json output file is
+    selected, print the JSON results to the console.
+    """
+    if json_file == '-':
+        outfile = click.open_file('-', mode='w')
+    else:
+        outfile = open_output(json_file)
+        click.get_current_context().call_on_close(outfile.close)
+    try:
+        compose(first, second, outfile)
+    except ComposeError as e:
+        raise click.UsageError(str(e))
@@ -0,0 +1,229 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+"""
+Compute the content overlap and change counts of every pair of scans of a
+set of scans at once from their file sha1, without diffing each pair.
+"""
+
+from __future__ import absolute_import
+
+from collections import Counter
+from collections import OrderedDict
+from collections import defaultdict
+from itertools import combinations
+import json
+
+import click
+import unicodecsv
+
+from deltacode import Stat
+from deltacode import __version__
+from deltacode.baselines import iter_scan_files
+from deltacode.utils import get_notice
+from deltacode.utils import open_output
+
+CSV_HEADERS = (
+    "Old Scan",
+    "New Scan",
+    "Old Files",
+    "New Files",
+    "Added",
+    "Removed",
+    "Unmodified",
+    "Percent Added",
+    "Percent Removed",
+    "Percent Unmodified",
+)
+
+
+def get_sha1_counts(location):
+    """
+    Return a Counter of the number of files by sha1 of the scan at
+    `location`. The empty files have a None sha1.
+    """
+    return Counter(sha1 for _path, sha1 in iter_scan_files(location))
+
+
+def get_shared_counts(sha1_counts):
+    """
+    Return a square matrix, a list of lists, of the number of files with the
+    same content in each pair of scans given a list of the `sha1_counts`
+    Counters of the scans: the sum over the sha1 of the smaller number of
+    files with this sha1 in either scan.
+
+    This is the product of the sparse matrix of the sha1 counts of the scans
+    with its transpose, computed from an inverted index of the scans of each
+    sha1. The sha1 in the same scans with the same counts are grouped so each
+    group is counted once: across releases, most files are in long runs of
+    consecutive releases.
+    """
+    postings = defaultdict(list)
+    for scan_index, counts in enumerate(sha1_counts):
+        for sha1, count in counts.items():
+            postings[sha1].append((scan_index, count))
+
+    weights = Counter(tuple(posting) for posting in postings.values())
+
+    size = len(sha1_counts)
+    shared = [[0] * size for _ in range(size)]
+    for posting, weight in weights.items():
+        for scan_index, count in posting:
+            shared[scan_index][scan_index] += weight * count
+        for (index1, count1), (index2, count2) in combinations(posting, 2):
+            value = weight * min(count1, count2)
+            shared[index1][index2] += value
+            shared[index2][index1] += value
+    return shared
+
+
+def get_stats(old_files_count, new_files_count, shared_count):
+    """
+    Return the Stat of a 'new' scan against an 'old' scan from their files
+    counts and the number of their files with the same content: these files
+    are unmodified and the others are added or removed.
+    """
+    stats = Stat(new_files_count, old_files_count)
+    stats.num_unmodified = shared_count
+    stats.num_added = new_files_count - shared_count
+    stats.num_removed = old_files_count - shared_count
+    stats.calculate_stats()
+    return stats
+
+
+class ScanMatrix(object):
+    """
+    The content overlap and change counts of each pair of the scans at the
+    `locations`.
+    """
+
+    def __init__(self, locations):
+        self.locations = list(locations)
+        sha1_counts = [get_sha1_counts(location) for location in self.locations]
+        self.files_counts = [sum(counts.values()) for counts in sha1_counts]
+        self.shared = get_shared_counts(sha1_counts)
+
+    def get_stats(self, old_index, new_index):
+        """
+        Return the Stat of the scan at `new_index` against the scan at
+        `old_index`.
+        """
+        return get_stats(
+            self.files_counts[old_index],
+            self.files_counts[new_index],
+            self.shared[old_index][new_index],
+        )
+
+    def iter_pairs(self):
+        """
+        Yield a tuple of (old index, new index, Stat) for each pair of scans,
+        by 'old' scan then by 'new' scan.
+        """
+        size = len(self.locations)
+        for old_index in range(size):
+            for new_index in range(size):
+                yield old_index, new_index, self.get_stats(old_index, new_index)
+
+    def to_dict(self):
+        """
+        Return an OrderedDict with a 'matrix' list of rows, one by 'old'
+        scan, of the stats of each 'new' scan against this 'old' scan. There
+        are no moved or modified files when matching by content only, so
+        their percentages are omitted.
+        """
+        size = len(self.locations)
+        matrix = [[None] * size for _ in range(size)]
+        for old_index, new_index, stats in self.iter_pairs():
+            matrix[old_index][new_index] = OrderedDict([
+                ("num_added", stats.num_added),
+                ("num_removed", stats.num_removed),
+                ("num_unmodified", stats.num_unmodified),
+                ("old_files_count", stats.old_files_count),
+                ("new_files_count", stats.new_files_count),
+                ("percent_added", stats.percent_added),
+                ("percent_removed", stats.percent_removed),
+                ("percent_unmodified", stats.percent_unmodified),
+            ])
+        return OrderedDict([
+            ("deltacode_notice", get_notice()),
+            ("deltacode_version", __version__),
+            ("scans", self.locations),
+            ("files_counts", self.files_counts),
+            ("matrix", matrix),
+        ])
+
+    def write_json(self, outfile):
+        """
+        Write the JSON matrix to the `outfile` text stream.
+        """
+        json.dump(self.to_dict(), outfile, indent=2)
+        outfile.write("\n")
+
+    def write_csv(self, outfile):
+        """
+        Write the CSV matrix to the `outfile` binary stream, one row for each
+        pair of scans.
+        """
+        writer = unicodecsv.writer(outfile)
+        writer.writerow(CSV_HEADERS)
+        for old_index, new_index, stats in self.iter_pairs():
+            writer.writerow([
+                self.locations[old_index],
+                self.locations[new_index],
+                stats.old_files_count,
+                stats.new_files_count,
+                stats.num_added,
+                stats.num_removed,
+                stats.num_unmodified,
+                stats.percent_added,
+                stats.percent_removed,
+                stats.percent_unmodified,
+            ])
+
+
+@click.command()
+@click.help_option('-h', '--help')
+@click.option('-j', '--json-file', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to the .json output file')
+@click.option('--csv', 'csv_file', type=click.Path(dir_okay=False, writable=True, allow_dash=True), help='Identify the path to the .csv output file, with one row for each pair of scans')
+@click.argument('scans', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, readable=True))
+def cli(json_file, csv_file, scans):
+    """
+    Compute the number of added, removed and unmodified files of each of the
+    SCANS scan files against each other one, from the sha1 of their files.
+    If no output file is selected, print the JSON matrix to the console.
+    """
+    scan_matrix = ScanMatrix(scans)
+    if not (json_file or csv_file):
+        json_file = '-'
+    if json_file == '-':
+        scan_matrix.write_json(click.open_file('-', mode='w'))
+    elif json_file:
+        with open_output(json_file) as outfile:
+            scan_matrix.write_json(outfile)
+    if csv_file == '-':
+        scan_matrix.write_csv(click.open_file('-', mode='wb'))
+    elif csv_file:
+        with open_output(csv_file, 'wb') as outfile:
+            scan_matrix.write_csv(outfile)
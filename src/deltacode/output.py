@@ -0,0 +1,1006 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from collections import deque
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import struct
+
+import simplejson
+from simplejson.encoder import encode_basestring_ascii
+import unicodecsv
+
+from deltacode import Delta
+from deltacode import __version__
+from deltacode.utils import DELTA_FIELDS, FILE_FIELDS
+from deltacode.utils import collect_errors, get_notice
+
+LICENSE_FIELDS = ("key", "score", "short_name", "category", "owner")
+COPYRIGHT_FIELDS = ("statements", "holders")
+CSV_HEADERS = ("Status", "Score", "Factors", "Path", "Name", "Type", "Size", "Old Path")
+
+
+def freeze(value):
+    """
+    Return a hashable version of a JSON `value`, with lists as tuples.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, freeze(item)) for key, item in value.items())
+    return value
+
+
+class DeltaTables(object):
+    """
+    Tables of the unique licenses and copyrights of the files of a list of
+    Delta objects, for an output where each file refers to its licenses and
+    copyrights by their index in these tables.
+
+    Only the tables of the `file_fields` are collected and output.
+    """
+
+    def __init__(self, deltas=(), file_fields=FILE_FIELDS):
+        self.licenses = []
+        self.license_ids = {}
+        self.copyrights = []
+        self.copyright_ids = {}
+        self.with_licenses = "licenses" in file_fields
+        self.with_copyrights = "copyrights" in file_fields
+        for delta in deltas:
+            for file in (delta.new_file, delta.old_file):
+                if file:
+                    if self.with_licenses:
+                        self.get_license_ids(file)
+                    if self.with_copyrights:
+                        self.get_copyright_ids(file)
+
+    def get_license_ids(self, file):
+        """
+        Return a list of the table indexes of the licenses of a `file`
+        resource, adding the licenses missing from the table.
+        """
+        ids = []
+        for license in getattr(file, "licenses", None) or []:
+            values = tuple(license.get(field, None) for field in LICENSE_FIELDS)
+            key = freeze(values)
+            license_id = self.license_ids.get(key)
+            if license_id is None:
+                license_id = self.license_ids[key] = len(self.licenses)
+                self.licenses.append(OrderedDict(zip(LICENSE_FIELDS, values)))
+            ids.append(license_id)
+        return ids
+
+    def get_copyright_ids(self, file):
+        """
+        Return a list of the table indexes of the copyrights of a `file`
+        resource, adding the copyrights missing from the table.
+        """
+        ids = []
+        for copyright in getattr(file, "copyrights", None) or []:
+            values = tuple(copyright.get(field, None) for field in COPYRIGHT_FIELDS)
+            key = freeze(values)
+            copyright_id = self.copyright_ids.get(key)
+            if copyright_id is None:
+                copyright_id = self.copyright_ids[key] = len(self.copyrights)
+                self.copyrights.append(OrderedDict(zip(COPYRIGHT_FIELDS, values)))
+            ids.append(copyright_id)
+        return ids
+
+    def to_dict(self):
+        """
+        Return an OrderedDict of the collected 'licenses' and 'copyrights'
+        tables.
+        """
+        tables = OrderedDict()
+        if self.with_licenses:
+            tables["licenses"] = self.licenses
+        if self.with_copyrights:
+            tables["copyrights"] = self.copyrights
+        return tables
+
+
+class JsonDeltaEncoder(object):
+    """
+    Encode Delta objects to JSON text straight from the fields of their
+    resources, without building intermediate dictionaries.
+
+    With the default `indent` of 2, the text is identical to what
+    simplejson.dump() produces for the same data with `indent=2`. With an
+    `indent` of None, the text is compact and fits on a single line.
+
+    If a DeltaTables `tables` is provided, the licenses and copyrights of each
+    file are encoded as lists of indexes in these tables.
+
+    If `changed_only` is True, the 'old' file of a delta that has both a 'new'
+    and an 'old' file is encoded with its path and only the fields that differ
+    from the 'new' file.
+
+    If `fields` is provided, as returned by parse_fields(), only the selected
+    delta and file fields are computed and encoded.
+    """
+
+    def __init__(self, indent=2, tables=None, changed_only=False, fields=None):
+        self.indent = indent
+        self.tables = tables
+        self.changed_only = changed_only
+        self.delta_fields, self.file_fields = fields or (DELTA_FIELDS, FILE_FIELDS)
+        if indent is None:
+            self.item_separator = ","
+            self.key_separator = ":"
+            self.scalar_encoder = simplejson.JSONEncoder(separators=(",", ":"))
+        else:
+            self.item_separator = ","
+            self.key_separator = ": "
+            self.scalar_encoder = simplejson.JSONEncoder(indent=indent)
+
+    def newline(self, level):
+        """
+        Return the line break and indentation that start a line at `level`.
+        """
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def encode_value(self, value, level=0):
+        """
+        Return the JSON text of a mapping, sequence or scalar `value` nested at
+        `level`.
+        """
+        cls = value.__class__
+        if cls is str:
+            return encode_basestring_ascii(value)
+        if cls is int:
+            return int.__repr__(value)
+        if isinstance(value, (list, tuple)):
+            if not value:
+                return "[]"
+            inner = self.newline(level + 1)
+            items = (self.item_separator + inner).join(
+                self.encode_value(item, level + 1) for item in value
+            )
+            return "[" + inner + items + self.newline(level) + "]"
+        if isinstance(value, dict) and all(key.__class__ is str for key in value):
+            if not value:
+                return "{}"
+            inner = self.newline(level + 1)
+            items = (self.item_separator + inner).join(
+                encode_basestring_ascii(key)
+                + self.key_separator
+                + self.encode_value(item, level + 1)
+                for key, item in value.items()
+            )
+            return "{" + inner + items + self.newline(level) + "}"
+        encoded = self.scalar_encoder.encode(value)
+        if self.indent is not None:
+            encoded = encoded.replace("\n", self.newline(level))
+        return encoded
+
+    def encode_items(self, items, level):
+        """
+        Return the JSON text of an object nested at `level` given a sequence
+        of (key, JSON text) `items`.
+        """
+        inner = self.newline(level + 1)
+        return (
+            "{"
+            + inner
+            + (self.item_separator + inner).join(
+                encode_basestring_ascii(key) + self.key_separator + text
+                for key, text in items
+            )
+            + self.newline(level)
+            + "}"
+        )
+
+    def encode_licenses(self, file, level):
+        """
+        Return the JSON text of the 'licenses' of a `file` resource.
+        """
+        if self.tables:
+            return self.encode_value(self.tables.get_license_ids(file), level)
+        try:
+            licenses = [
+                self.encode_items(
+                    [
+                        (field, self.encode_value(license.get(field, None), level + 2))
+                        for field in LICENSE_FIELDS
+                    ],
+                    level + 1,
+                )
+                for license in file.licenses
+            ]
+        except (AttributeError, KeyError, TypeError):
+            return "[]"
+        return self.encode_list(licenses, level)
+
+    def encode_copyrights(self, file, level):
+        """
+        Return the JSON text of the 'copyrights' of a `file` resource.
+        """
+        if self.tables:
+            return self.encode_value(self.tables.get_copyright_ids(file), level)
+        try:
+            copyrights = file.copyrights
+        except AttributeError:
+            return "[]"
+        copyrights = [
+            self.encode_items(
+                [
+                    (field, self.encode_value(copyright.get(field, None), level + 2))
+                    for field in COPYRIGHT_FIELDS
+                ],
+                level + 1,
+            )
+            for copyright in copyrights
+        ]
+        return self.encode_list(copyrights, level)
+
+    def encode_list(self, encoded_items, level):
+        """
+        Return the JSON text of an array nested at `level` given a list of
+        already encoded items.
+        """
+        if not encoded_items:
+            return "[]"
+        inner = self.newline(level + 1)
+        return (
+            "[" + inner + (self.item_separator + inner).join(encoded_items) + self.newline(level) + "]"
+        )
+
+    def file_items(self, delta, file, new_file, level):
+        """
+        Return a list of (key, JSON text) items for the selected fields of the
+        'new' or 'old' `file` resource of a `delta` nested at `level`.
+        """
+        value = self.encode_value
+        items = []
+        for field in self.file_fields:
+            if field == "path":
+                text = value(delta.aligned_path(new_file))
+            elif field == "fingerprint":
+                text = value(getattr(file, "fingerprint", ""), level + 1)
+            elif field == "original_path":
+                text = value(file.path)
+            elif field == "licenses":
+                text = self.encode_licenses(file, level + 1)
+            elif field == "copyrights":
+                text = self.encode_copyrights(file, level + 1)
+            else:
+                text = value(getattr(file, field))
+            items.append((field, text))
+        return items
+
+    def encode_file(self, delta, file, new_file, level):
+        """
+        Return the JSON text of the 'new' or 'old' `file` resource of a
+        `delta` nested at `level`.
+        """
+        if not file:
+            return "null"
+        return self.encode_items(self.file_items(delta, file, new_file, level), level)
+
+    def encode_files(self, delta, level):
+        """
+        Return a tuple of the JSON texts of the 'new' and 'old' files of a
+        `delta` nested at `level`.
+        """
+        if self.changed_only and delta.new_file and delta.old_file:
+            new_items = self.file_items(delta, delta.new_file, True, level)
+            old_items = self.file_items(delta, delta.old_file, False, level)
+            new_values = dict(new_items)
+            # keep the path and the fields that differ from the new file
+            old_items = [
+                (key, text) for key, text in old_items
+                if key == "path" or text != new_values[key]
+            ]
+            return self.encode_items(new_items, level), self.encode_items(old_items, level)
+        return (
+            self.encode_file(delta, delta.new_file, True, level),
+            self.encode_file(delta, delta.old_file, False, level),
+        )
+
+    def encode_delta(self, delta, level=0):
+        """
+        Return the JSON text of the selected fields of a `delta` nested at
+        `level`.
+        """
+        delta_fields = self.delta_fields
+        files = None
+        items = []
+        for field in delta_fields:
+            if field == "new" and "old" not in delta_fields:
+                text = self.encode_file(delta, delta.new_file, True, level + 1)
+            elif field == "new" or field == "old":
+                if files is None:
+                    files = self.encode_files(delta, level + 1)
+                text = files[0] if field == "new" else files[1]
+            elif field == "factors":
+                text = self.encode_value(delta.factors, level + 1)
+            else:
+                text = self.encode_value(getattr(delta, field))
+            items.append((field, text))
+        return self.encode_items(items, level)
+
+
+def selected_deltas(deltacode, all_delta_types=False):
+    """
+    Return a list of the Delta objects of a `deltacode` selected for output:
+    omit all unmodified Delta objects unless `all_delta_types` is True.
+    """
+    if all_delta_types is True:
+        return list(deltacode.deltas)
+    return [delta for delta in deltacode.deltas if not delta.status == "unmodified"]
+
+
+def get_headers(deltacode, deltas_count):
+    """
+    Return an OrderedDict of the top-level DeltaCode results that come before
+    the 'deltas' for a `deltacode` with `deltas_count` selected deltas.
+    """
+    headers = OrderedDict([
+        ('deltacode_notice', get_notice()),
+        ('new_scan_options', deltacode.new_scan_options),
+        ('old_scan_options', deltacode.old_scan_options),
+        ('deltacode_options', deltacode.options),
+        ('deltacode_version', __version__),
+        ('deltacode_errors', collect_errors(deltacode)),
+        ('deltas_count', deltas_count),
+        ('delta_stats', deltacode.stats.to_dict()),
+    ])
+    # only a diff out of its time budget has truncated stages
+    if deltacode.truncated_stages:
+        headers['truncated_stages'] = deltacode.truncated_stages
+    return headers
+
+
+def is_null_delta(deltacode, delta):
+    """
+    Return True if `delta` is serialized as a JSON null, i.e., when
+    Delta.to_dict() returns None for it.
+    """
+    return (
+        not deltacode.options.get("--all-delta-types", "") == True
+        and delta.status == "unmodified"
+    )
+
+
+def get_encoder(deltas, headers, indent=2, dictionary_encode=False, changed_only=False,
+                fields=None):
+    """
+    Return a JsonDeltaEncoder for a list of `deltas`. If `dictionary_encode`
+    is True, the licenses and copyrights tables of the encoder are added to
+    the `headers` mapping.
+    """
+    tables = None
+    if dictionary_encode:
+        tables = DeltaTables(deltas, fields[1] if fields else FILE_FIELDS)
+        headers.update(tables.to_dict())
+    return JsonDeltaEncoder(
+        indent=indent, tables=tables, changed_only=changed_only, fields=fields
+    )
+
+
+JSON_CHUNK_SIZE = 1000
+
+
+class FileRecord(object):
+    """
+    A picklable copy of the fields of a scan resource that the
+    JsonDeltaEncoder encodes, to send a file to a worker process.
+    """
+
+    __slots__ = (
+        "path",
+        "type",
+        "name",
+        "size",
+        "sha1",
+        "fingerprint",
+        "licenses",
+        "copyrights",
+    )
+
+    def __init__(self, file):
+        self.path = file.path
+        self.type = file.type
+        self.name = file.name
+        self.size = file.size
+        self.sha1 = file.sha1
+        self.fingerprint = getattr(file, "fingerprint", "")
+        self.licenses = getattr(file, "licenses", [])
+        self.copyrights = getattr(file, "copyrights", [])
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def delta_record(delta):
+    """
+    Return a picklable copy of a `delta` with FileRecord files and its
+    aligned paths.
+    """
+    record = Delta(
+        delta.score,
+        delta.new_file and FileRecord(delta.new_file),
+        delta.old_file and FileRecord(delta.old_file),
+    )
+    record.new_path = delta.aligned_path(True)
+    record.old_path = delta.aligned_path(False)
+    record.factors = delta.factors
+    record.status = delta.status
+    return record
+
+
+def encode_deltas(encoder, deltas, level, separator):
+    """
+    Return the JSON texts of a list of `deltas` nested at `level`, joined by
+    `separator`. A None delta is encoded as a JSON null.
+    """
+    return separator.join(
+        "null" if delta is None else encoder.encode_delta(delta, level) for delta in deltas
+    )
+
+
+# the JsonDeltaEncoder of a worker process
+_worker_encoder = None
+
+
+def _init_worker(encoder):
+    global _worker_encoder
+    _worker_encoder = encoder
+
+
+def _encode_chunk(args):
+    deltas, level, separator = args
+    return encode_deltas(_worker_encoder, deltas, level, separator)
+
+
+def iter_encoded_chunks(deltacode, deltas, encoder, level, separator, processes=1,
+                        chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yield the JSON texts of consecutive chunks of `chunk_size` Delta objects
+    from the `deltas` list, as returned by encode_deltas(), in order.
+
+    If `processes` is greater than 1 and there is more than one chunk, the
+    chunks are encoded in that many worker processes and the texts are
+    identical to a sequential encoding. The chunks are created and sent to the workers as the texts are
+    yielded, with at most two chunks per process pending at once.
+    """
+    chunks = (
+        [
+            None if is_null_delta(deltacode, delta) else delta
+            for delta in deltas[start:start + chunk_size]
+        ]
+        for start in range(0, len(deltas), chunk_size)
+    )
+    if processes <= 1 or len(deltas) <= chunk_size:
+        for chunk in chunks:
+            yield encode_deltas(encoder, chunk, level, separator)
+        return
+
+    tasks = (
+        ([delta and delta_record(delta) for delta in chunk], level, separator)
+        for chunk in chunks
+    )
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(encoder,))
+    # Pool.imap() would pickle and queue all the chunks at once: keep at most
+    # two chunks per process in flight so the memory used is bounded
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.apply_async(_encode_chunk, (task,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_json(deltacode, outfile, all_delta_types=False, dictionary_encode=False,
+               changed_only=False, fields=None, processes=1, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Using the DeltaCode object, write JSON text containing the primary
+    information from the Delta objects to the `outfile` text stream.  Omit
+    all unmodified Delta objects unless the user selects the
+    '-a'/'--all-delta-types' option.
+
+    Each delta is written as soon as it is encoded and the output is identical
+    to a simplejson.dump() of the results with an indent of 2.
+
+    If `dictionary_encode` is True, write top-level 'licenses' and
+    'copyrights' tables and refer to their entries by index in the files.
+
+    If `changed_only` is True, write only the path and the changed fields of
+    the 'old' file of each delta that has both a 'new' and an 'old' file.
+
+    If `fields` is provided, as returned by parse_fields(), write only the
+    selected delta and file fields.
+
+    If `processes` is greater than 1, encode chunks of `chunk_size` deltas in
+    that many worker processes and write each chunk in order as soon as it is
+    encoded.  The output is identical to the sequential output.
+    """
+    deltas = selected_deltas(deltacode, all_delta_types)
+    headers = get_headers(deltacode, len(deltas))
+    encoder = get_encoder(deltas, headers, 2, dictionary_encode, changed_only, fields)
+    chunks = iter_encoded_chunks(
+        deltacode, deltas, encoder, 2, "," + encoder.newline(2), processes, chunk_size
+    )
+    write_json_document(outfile, headers, encoder, chunks)
+
+
+def write_json_document(outfile, headers, encoder, chunks):
+    """
+    Write to the `outfile` text stream the JSON text of an object with the
+    `headers` mapping items followed by a 'deltas' array, using an `encoder`
+    JsonDeltaEncoder with an indent.  `chunks` is an iterable of the JSON
+    texts of consecutive deltas nested at level 2, each chunk with one or
+    more deltas joined as by encode_deltas().
+    """
+    newline = encoder.newline
+
+    outfile.write("{")
+    for key, value in headers.items():
+        outfile.write(newline(1) + encoder.encode_value(key) + ": ")
+        outfile.write(encoder.encode_value(value, 1) + ",")
+
+    outfile.write(newline(1) + '"deltas": [')
+    separator = ""
+    for chunk in chunks:
+        outfile.write(separator + newline(2) + chunk)
+        separator = ","
+    if separator:
+        outfile.write(newline(1))
+    outfile.write("]")
+    outfile.write(newline(0) + "}")
+    outfile.write("\n")
+
+
+def write_stats_json(stats, outfile, options):
+    """
+    Write JSON text with the notice, the `options` mapping, the version and
+    the 'delta_stats' of a Stat object `stats` to the `outfile` text stream.
+    """
+    results = OrderedDict([
+        ('deltacode_notice', get_notice()),
+        ('deltacode_options', options),
+        ('deltacode_version', __version__),
+        ('delta_stats', stats.to_dict()),
+    ])
+    outfile.write(JsonDeltaEncoder().encode_value(results))
+    outfile.write("\n")
+
+
+def copy_json(infile, outfile, options):
+    """
+    Copy the JSON text of DeltaCode results with an indent of 2 from the
+    `infile` text stream to the `outfile` text stream, replacing their
+    'deltacode_options' with the `options` mapping.
+    """
+    prefix = '  "deltacode_options": '
+    line = infile.readline()
+    while line and not line.startswith(prefix):
+        outfile.write(line)
+        line = infile.readline()
+    if line:
+        outfile.write(prefix + JsonDeltaEncoder().encode_value(options, 1) + ",\n")
+        # skip the lines of the replaced options up to their closing brace
+        while line and not line.startswith(("  },", prefix + "{},")):
+            line = infile.readline()
+    shutil.copyfileobj(infile, outfile)
+
+
+def write_json_lines(deltacode, outfile, all_delta_types=False, dictionary_encode=False,
+                     changed_only=False, fields=None, processes=1,
+                     chunk_size=JSON_CHUNK_SIZE):
+    """
+    Using the DeltaCode object, write JSON Lines to the `outfile` text stream:
+    a first line with the top-level results (notice, options, version, errors
+    and stats) and then one line for each Delta object, in the same order as
+    the 'deltas' of the JSON output.  Omit all unmodified Delta objects unless
+    the user selects the '-a'/'--all-delta-types' option.
+
+    If `dictionary_encode` is True, the 'licenses' and 'copyrights' tables
+    are written in the first line. The 'old' files for `changed_only` and
+    the `fields` are written and the `processes` are used as for
+    write_json().
+    """
+    deltas = selected_deltas(deltacode, all_delta_types)
+    headers = get_headers(deltacode, len(deltas))
+    encoder = get_encoder(deltas, headers, None, dictionary_encode, changed_only, fields)
+
+    outfile.write(encoder.encode_value(headers))
+    outfile.write("\n")
+    chunks = iter_encoded_chunks(deltacode, deltas, encoder, 0, "\n", processes, chunk_size)
+    for chunk in chunks:
+        outfile.write(chunk)
+        outfile.write("\n")
+
+
+def delta_to_csv_row(delta):
+    """
+    Return a list of CSV column values for a `delta`, in the order of the
+    CSV_HEADERS columns.
+    """
+    file = delta.new_file or delta.old_file
+    if file:
+        path, name, type, size = file.path, file.name, file.type, file.size
+    else:
+        path = name = type = size = None
+    # TODO: Need better way to ID 'moved' deltas.
+    old_path = delta.old_file.path if delta.status == "moved" and delta.old_file else ""
+    return [
+        delta.status,
+        delta.score,
+        " ".join(delta.factors),
+        path,
+        name,
+        type,
+        size,
+        old_path,
+    ]
+
+
+def write_csv(deltacode, outfile, all_delta_types=False):
+    """
+    Using the DeltaCode object, write CSV rows to the `outfile` binary stream,
+    one row for each Delta object and with the same columns as the
+    etc/scripts/json2csv.py conversion of the JSON output.  Omit all
+    unmodified Delta objects unless the user selects the
+    '-a'/'--all-delta-types' option.
+    """
+    writer = unicodecsv.writer(outfile)
+    writer.writerow(CSV_HEADERS)
+    deltas = selected_deltas(deltacode, all_delta_types)
+    if not deltas:
+        writer.writerow([""] * len(CSV_HEADERS))
+    for delta in deltas:
+        writer.writerow(delta_to_csv_row(delta))
+
+
+# Number of deltas in each record batch of the Arrow and Parquet outputs
+ARROW_BATCH_SIZE = 10000
+
+
+def has_pyarrow():
+    """
+    Return True if the optional pyarrow package is installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+def get_arrow_schema(deltacode, deltas_count):
+    """
+    Return a pyarrow Schema for the deltas of a `deltacode` with
+    `deltas_count` selected deltas. The top-level results other than the
+    deltas, e.g., 'delta_stats', are stored in the schema metadata as JSON
+    strings.
+    """
+    import pyarrow as pa
+
+    string_list = pa.list_(pa.string())
+    fields = [
+        ("status", pa.string()),
+        ("score", pa.int64()),
+        ("factors", string_list),
+        ("new_path", pa.string()),
+        ("old_path", pa.string()),
+        ("new_sha1", pa.string()),
+        ("old_sha1", pa.string()),
+        ("new_size", pa.int64()),
+        ("old_size", pa.int64()),
+        ("new_license_keys", string_list),
+        ("old_license_keys", string_list),
+        ("new_license_categories", string_list),
+        ("old_license_categories", string_list),
+    ]
+    metadata = OrderedDict(
+        (key, simplejson.dumps(value))
+        for key, value in get_headers(deltacode, deltas_count).items()
+    )
+    return pa.schema(fields, metadata=metadata)
+
+
+def get_license_values(file, field):
+    """
+    Return a list of the `field` values of the licenses of a `file` resource.
+    """
+    if not file:
+        return None
+    return [license.get(field) for license in getattr(file, "licenses", None) or []]
+
+
+def get_arrow_columns(deltas, schema):
+    """
+    Return a mapping of column name to a list of values for a list of
+    `deltas`, with the columns of the Arrow `schema`.
+    """
+    columns = OrderedDict((name, []) for name in schema.names)
+    for delta in deltas:
+        new, old = delta.new_file, delta.old_file
+        columns["status"].append(delta.status)
+        columns["score"].append(delta.score)
+        columns["factors"].append(delta.factors)
+        columns["new_path"].append(delta.aligned_path(new_file=True))
+        columns["old_path"].append(delta.aligned_path(new_file=False))
+        columns["new_sha1"].append(new.sha1 if new else None)
+        columns["old_sha1"].append(old.sha1 if old else None)
+        columns["new_size"].append(new.size if new else None)
+        columns["old_size"].append(old.size if old else None)
+        columns["new_license_keys"].append(get_license_values(new, "key"))
+        columns["old_license_keys"].append(get_license_values(old, "key"))
+        columns["new_license_categories"].append(get_license_values(new, "category"))
+        columns["old_license_categories"].append(get_license_values(old, "category"))
+    return columns
+
+
+def write_arrow(deltacode, location, all_delta_types=False, file_format="parquet",
+                batch_size=ARROW_BATCH_SIZE):
+    """
+    Using the DeltaCode object, write the deltas as a columnar table to a
+    Parquet file or, if `file_format` is "arrow", an Arrow IPC file at
+    `location`. The rows are written in record batches of `batch_size`
+    deltas.  Omit all unmodified Delta objects unless the user selects the
+    '-a'/'--all-delta-types' option.
+
+    This requires the optional pyarrow package.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    deltas = selected_deltas(deltacode, all_delta_types)
+    schema = get_arrow_schema(deltacode, len(deltas))
+
+    if file_format == "arrow":
+        writer = pa.ipc.new_file(location, schema)
+    else:
+        writer = pq.ParquetWriter(location, schema)
+
+    try:
+        for start in range(0, len(deltas), batch_size):
+            columns = get_arrow_columns(deltas[start:start + batch_size], schema)
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+    finally:
+        writer.close()
+
+
+# Number of deltas inserted in each bulk insert of the SQLite output
+SQLITE_BATCH_SIZE = 10000
+
+SQLITE_TABLES = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path TEXT,
+    original_path TEXT,
+    type TEXT,
+    name TEXT,
+    size INTEGER,
+    sha1 TEXT,
+    fingerprint TEXT
+);
+CREATE TABLE deltas (
+    id INTEGER PRIMARY KEY,
+    status TEXT,
+    score INTEGER,
+    new_file_id INTEGER REFERENCES files(id),
+    old_file_id INTEGER REFERENCES files(id)
+);
+CREATE TABLE factors (
+    delta_id INTEGER REFERENCES deltas(id),
+    factor TEXT
+);
+CREATE TABLE licenses (
+    file_id INTEGER REFERENCES files(id),
+    key TEXT,
+    score REAL,
+    short_name TEXT,
+    category TEXT,
+    owner TEXT
+);
+CREATE TABLE copyrights (
+    file_id INTEGER REFERENCES files(id),
+    statements TEXT,
+    holders TEXT
+);
+"""
+
+# Created after the bulk load, which is faster than updating them on insert
+SQLITE_INDEXES = """
+CREATE INDEX deltas_status ON deltas(status);
+CREATE INDEX deltas_score ON deltas(score);
+CREATE INDEX files_path ON files(path);
+CREATE INDEX factors_delta_id ON factors(delta_id);
+CREATE INDEX factors_factor ON factors(factor);
+CREATE INDEX licenses_file_id ON licenses(file_id);
+CREATE INDEX licenses_key ON licenses(key);
+CREATE INDEX copyrights_file_id ON copyrights(file_id);
+"""
+
+
+def get_sqlite_rows(deltas, first_id):
+    """
+    Return a mapping of table name to a list of rows for a list of `deltas`,
+    numbering the deltas and files from `first_id`.
+    """
+    rows = OrderedDict(
+        (table, []) for table in ("files", "deltas", "factors", "licenses", "copyrights")
+    )
+    # each delta has at most two files: use distinct file ids for each batch
+    file_id = (first_id - 1) * 2
+    for delta_id, delta in enumerate(deltas, first_id):
+        file_ids = []
+        for file, new_file in ((delta.new_file, True), (delta.old_file, False)):
+            if not file:
+                file_ids.append(None)
+                continue
+            file_id += 1
+            file_ids.append(file_id)
+            rows["files"].append((
+                file_id,
+                delta.aligned_path(new_file),
+                file.path,
+                file.type,
+                file.name,
+                file.size,
+                file.sha1,
+                getattr(file, "fingerprint", ""),
+            ))
+            for license in getattr(file, "licenses", None) or []:
+                rows["licenses"].append(
+                    (file_id,) + tuple(license.get(field) for field in LICENSE_FIELDS)
+                )
+            for copyright in getattr(file, "copyrights", None) or []:
+                rows["copyrights"].append((
+                    file_id,
+                    simplejson.dumps(copyright.get("statements")),
+                    simplejson.dumps(copyright.get("holders")),
+                ))
+        rows["deltas"].append((delta_id, delta.status, delta.score) + tuple(file_ids))
+        for factor in delta.factors:
+            rows["factors"].append((delta_id, factor))
+    return rows
+
+
+def write_sqlite(deltacode, location, all_delta_types=False, batch_size=SQLITE_BATCH_SIZE):
+    """
+    Using the DeltaCode object, write the deltas to a new SQLite database at
+    `location`, replacing any existing file. The deltas, files, licenses,
+    copyrights and factors are stored in normalized tables and the other
+    top-level results in a 'metadata' table of JSON values.  Omit all
+    unmodified Delta objects unless the user selects the
+    '-a'/'--all-delta-types' option.
+    """
+    deltas = selected_deltas(deltacode, all_delta_types)
+    if os.path.exists(location):
+        os.remove(location)
+
+    connection = sqlite3.connect(location)
+    try:
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SQLITE_TABLES)
+        with connection:
+            connection.executemany(
+                "INSERT INTO metadata VALUES (?, ?)",
+                [
+                    (key, simplejson.dumps(value))
+                    for key, value in get_headers(deltacode, len(deltas)).items()
+                ],
+            )
+            for start in range(0, len(deltas), batch_size):
+                rows = get_sqlite_rows(deltas[start:start + batch_size], start + 1)
+                for table, table_rows in rows.items():
+                    if not table_rows:
+                        continue
+                    placeholders = ", ".join("?" * len(table_rows[0]))
+                    connection.executemany(
+                        "INSERT INTO {} VALUES ({})".format(table, placeholders),
+                        table_rows,
+                    )
+        connection.executescript(SQLITE_INDEXES)
+    finally:
+        connection.close()
+
+
+# Each MessagePack frame is prefixed by its length as a 4-byte big-endian integer
+MSGPACK_FRAME_PREFIX = struct.Struct(">I")
+
+
+def has_msgpack():
+    """
+    Return True if the optional msgpack package is installed.
+    """
+    try:
+        import msgpack
+    except ImportError:
+        return False
+    return True
+
+
+def write_msgpack(deltacode, outfile, all_delta_types=False, fields=None):
+    """
+    Using the DeltaCode object, write a stream of length-prefixed MessagePack
+    frames to the `outfile` binary stream: a first frame with the top-level
+    results and then one frame for each Delta object with the same fields as
+    Delta.to_dict().  Omit all unmodified Delta objects unless the user
+    selects the '-a'/'--all-delta-types' option.  If `fields` is provided,
+    as returned by parse_fields(), write only the selected fields.
+
+    This requires the optional msgpack package.
+    """
+    import msgpack
+
+    packer = msgpack.Packer(use_bin_type=True)
+    deltas = selected_deltas(deltacode, all_delta_types)
+
+    def write_frame(value):
+        frame = packer.pack(value)
+        outfile.write(MSGPACK_FRAME_PREFIX.pack(len(frame)))
+        outfile.write(frame)
+
+    write_frame(get_headers(deltacode, len(deltas)))
+    for delta in deltas:
+        write_frame(delta.to_dict(deltacode, fields))
+
+
+def iter_msgpack_frames(stream):
+    """
+    Yield the values decoded from the length-prefixed MessagePack frames of a
+    binary `stream` as written by write_msgpack(), one frame at a time.
+    """
+    import msgpack
+
+    prefix_size = MSGPACK_FRAME_PREFIX.size
+    while True:
+        prefix = stream.read(prefix_size)
+        if not prefix:
+            return
+        if len(prefix) < prefix_size:
+            raise ValueError("Truncated MessagePack frame length")
+        (size,) = MSGPACK_FRAME_PREFIX.unpack(prefix)
+        frame = stream.read(size)
+        if len(frame) < size:
+            raise ValueError("Truncated MessagePack frame")
+        yield msgpack.unpackb(frame, raw=False)
@@ -0,0 +1,378 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+"""
+A long-running local DeltaCode diff service. It keeps the recently used
+scans loaded in memory and answers diff requests over HTTP on localhost or
+on a Unix socket:
+
+- POST /diff with a JSON object body with the 'new' and 'old' scan paths and
+  the optional 'all_delta_types', 'stats_only' and 'fields' values returns
+  the DeltaCode JSON results.
+- GET /stats returns the cache and requests statistics.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import hashlib
+import io
+import json
+import os
+import socketserver
+import stat
+import threading
+import traceback
+
+import click
+from commoncode.resource import VirtualCodebase
+
+from deltacode import DeltaCode
+from deltacode import __version__
+from deltacode import get_stats
+from deltacode.output import write_json
+from deltacode.output import write_stats_json
+from deltacode.utils import FileError
+from deltacode.utils import open_input
+from deltacode.utils import parse_fields
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+DEFAULT_MAX_DIFFS = 4
+DEFAULT_QUEUE_TIMEOUT = 30
+
+
+class ServiceBusy(Exception):
+    """
+    Raised when a diff request waits for a free slot longer than the queue
+    timeout.
+    """
+
+    pass
+
+
+class CodebaseCache(object):
+    """
+    A least recently used cache of the VirtualCodebases of scan files, keyed
+    by the real path, the modification time and the size of each file, so
+    that a cache hit does not read the file and a scan that changes on disk
+    is loaded again. On a miss, the file is read and the codebase of a cached
+    scan with the same sha256 is reused, e.g., for a file touched or
+    rewritten with the same content.
+
+    The total size of the cached scans, counted as the size of their
+    uncompressed JSON, is kept under `max_bytes` by evicting the least
+    recently used ones.  A scan larger than `max_bytes` is not cached.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        # mapping of {key: (codebase, size, sha256)} from the least to the
+        # most recently used
+        self.entries = OrderedDict()
+        # mapping of {sha256: key} of the cached codebases
+        self.keys_by_digest = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, location):
+        """
+        Return the VirtualCodebase of the scan file at `location`, possibly
+        compressed, loading it if it is not cached.
+        """
+        if not os.path.isfile(location):
+            raise FileError("{} is expected to be a file".format(location))
+        status = os.stat(location)
+        key = (os.path.realpath(location), status.st_mtime_ns, status.st_size)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        with open_input(location, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            cached_key = self.keys_by_digest.get(digest)
+            if cached_key:
+                # the same content under another key: a stale key of the
+                # same file or a copy, move its codebase to the new key
+                codebase, size, _digest = self.entries.pop(cached_key)
+                self.entries[key] = codebase, size, digest
+                self.keys_by_digest[digest] = key
+                return codebase
+
+        # keep all the resources in memory: a cached codebase is shared by
+        # concurrent diffs
+        codebase = VirtualCodebase(json.loads(data), max_in_memory=0)
+        codebase.compute_counts()
+        return self.add(key, codebase, len(data), digest)
+
+    def add(self, key, codebase, size, digest):
+        """
+        Cache a `codebase` of `size` bytes and `digest` sha256 with `key` and
+        return the cached codebase, which is the one of another request if it
+        was cached first.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                return entry[0]
+            if size > self.max_bytes:
+                return codebase
+            self.entries[key] = codebase, size, digest
+            self.keys_by_digest[digest] = key
+            self.size += size
+            while self.size > self.max_bytes:
+                evicted_key, (_codebase, evicted_size, evicted_digest) = self.entries.popitem(last=False)
+                if self.keys_by_digest.get(evicted_digest) == evicted_key:
+                    del self.keys_by_digest[evicted_digest]
+                self.size -= evicted_size
+                self.evictions += 1
+            return codebase
+
+    def to_dict(self):
+        """
+        Return an OrderedDict of the cache statistics.
+        """
+        with self.lock:
+            return OrderedDict([
+                ("entries", len(self.entries)),
+                ("size", self.size),
+                ("max_size", self.max_bytes),
+                ("hits", self.hits),
+                ("misses", self.misses),
+                ("evictions", self.evictions),
+            ])
+
+
+class DiffService(object):
+    """
+    Run diff requests against the codebases of a CodebaseCache, at most
+    `max_diffs` at a time. A request waits up to `queue_timeout` seconds for
+    a free slot.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, max_diffs=DEFAULT_MAX_DIFFS,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.cache = CodebaseCache(cache_size)
+        self.max_diffs = max_diffs
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_diffs)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def diff(self, request):
+        """
+        Return the JSON text of the DeltaCode results for a `request` mapping
+        with the 'new' and 'old' scan paths and the optional
+        'all_delta_types', 'stats_only' and 'fields' values.
+
+        Raise a ValueError for an invalid request, a FileError for a missing
+        scan and ServiceBusy if no slot is free in time.
+        """
+        for name in ("new", "old"):
+            if name not in request:
+                raise ValueError("Missing request value: '{}'".format(name))
+        new = request["new"]
+        old = request["old"]
+        all_delta_types = request.get("all_delta_types", False) is True
+        fields = parse_fields(request.get("fields"))
+
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            with self.lock:
+                self.rejected += 1
+            raise ServiceBusy("All the {} diff slots are busy.".format(self.max_diffs))
+
+        with self.lock:
+            self.active += 1
+        try:
+            codebases = self.cache.get(new), self.cache.get(old)
+            options = OrderedDict([
+                ("--new", new),
+                ("--old", old),
+                ("--all-delta-types", all_delta_types),
+            ])
+            outfile = io.StringIO()
+            if request.get("stats_only", False) is True:
+                write_stats_json(get_stats(*codebases), outfile, options)
+            else:
+                deltacode = DeltaCode(new, old, options, codebases)
+                write_json(deltacode, outfile, all_delta_types, fields=fields)
+            with self.lock:
+                self.completed += 1
+            return outfile.getvalue()
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    def to_dict(self):
+        """
+        Return an OrderedDict of the service statistics.
+        """
+        with self.lock:
+            requests = OrderedDict([
+                ("max_diffs", self.max_diffs),
+                ("active", self.active),
+                ("completed", self.completed),
+                ("failed", self.failed),
+                ("rejected", self.rejected),
+            ])
+        return OrderedDict([
+            ("deltacode_version", __version__),
+            ("requests", requests),
+            ("cache", self.cache.to_dict()),
+        ])
+
+
+class DiffRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handle the HTTP requests of a DiffService server.
+    """
+
+    server_version = "DeltaCode/" + __version__
+
+    def send_text(self, code, text, content_type="application/json"):
+        body = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, code, message):
+        self.send_text(code, json.dumps({"error": message}) + "\n")
+
+    def do_GET(self):
+        if self.path != "/stats":
+            return self.send_error_json(404, "Unknown path: {}".format(self.path))
+        self.send_text(200, json.dumps(self.server.service.to_dict(), indent=2) + "\n")
+
+    def do_POST(self):
+        if self.path != "/diff":
+            return self.send_error_json(404, "Unknown path: {}".format(self.path))
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object.")
+            results = self.server.service.diff(request)
+        except (ValueError, FileError, OSError) as e:
+            return self.send_error_json(400, str(e))
+        except ServiceBusy as e:
+            return self.send_error_json(503, str(e))
+        except Exception as e:
+            # e.g., a scan without the expected fields
+            self.log_error("Diff request failed:\n%s", traceback.format_exc())
+            return self.send_error_json(500, "{}: {}".format(type(e).__name__, e))
+        self.send_text(200, results)
+
+    def address_string(self):
+        # a Unix socket client has no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, "quiet", False):
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def log_error(self, format, *args):
+        # log the errors even when quiet
+        BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """
+    A threading HTTP server listening on a Unix socket.
+    """
+
+    daemon_threads = True
+
+
+def make_server(service, port=8000, socket_path=None, quiet=False):
+    """
+    Return a threading HTTP server for a DiffService `service` listening on
+    the Unix socket at `socket_path` or else on localhost at `port`.
+    """
+    if socket_path:
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            # a stale socket from a previous server
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, DiffRequestHandler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), DiffRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+    return server
+
+
+@click.command()
+@click.help_option('-h', '--help')
+@click.option('--port', default=8000, show_default=True, type=click.IntRange(min=0, max=65535), help='Listen on this localhost port')
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False), help='Listen on a Unix socket at this path instead of a localhost port')
+@click.option('--cache-size', default=DEFAULT_CACHE_SIZE // (1024 * 1024), show_default=True, type=click.IntRange(min=0), help='Maximum size in MB of the cached scans, counted as uncompressed JSON')
+@click.option('--max-diffs', default=DEFAULT_MAX_DIFFS, show_default=True, type=click.IntRange(min=1), help='Maximum number of diffs run at the same time')
+@click.option('--queue-timeout', default=DEFAULT_QUEUE_TIMEOUT, show_default=True, type=click.FloatRange(min=0), help='Seconds a diff waits for a free slot before it is rejected')
+@click.option('--quiet', is_flag=True, help='Do not log the requests')
+def cli(port, socket_path, cache_size, max_diffs, queue_timeout, quiet):
+    """
+    Serve DeltaCode diffs on localhost or on a Unix socket, keeping the
+    recently used scans loaded in memory.  POST a JSON object with the "new"
+    and "old" scan paths and the optional "all_delta_types", "stats_only"
+    and "fields" values to /diff to get the DeltaCode JSON results.  GET
+    /stats for the cache and requests statistics.
+    """
+    service = DiffService(cache_size * 1024 * 1024, max_diffs, queue_timeout)
+    server = make_server(service, port, socket_path, quiet)
+    if socket_path:
+        click.echo('Serving DeltaCode diffs on {}'.format(socket_path))
+    else:
+        click.echo('Serving DeltaCode diffs on http://127.0.0.1:{}/'.format(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
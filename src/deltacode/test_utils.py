@@ -154,7 +154,7 @@ def streamline_errors(errors):
 
 
 def get_aligned_path(delta, path, new_file):
-    OFFSET = delta.NEW_CODEBASE_OFFSET if new_file else delta.OLD_CODEBASE_OFFSET
+    OFFSET = delta.new_offset if new_file else delta.old_offset
     return "/".join(paths.split(path)[OFFSET:])
 
 
@@ -27,20 +27,117 @@ from __future__ import absolute_import, division
 
 from bitarray import bitarray
 from collections import defaultdict
+from collections import deque
 from bitarray.util import count_xor
 
 import binascii
+import gzip
+import io
+import json
+import lzma
 import os
 
 from commoncode import paths
+from commoncode.resource import clean_path
 from collections import OrderedDict
 
 
+# License categories in bit order: the "notable" categories first, then the
+# permissive ones.
+LICENSE_CATEGORIES = [
+    "Commercial",
+    "Copyleft",
+    "Copyleft Limited",
+    "Free Restricted",
+    "Patent License",
+    "Proprietary Free",
+    "Permissive",
+    "Public Domain",
+]
+
+
+class CategoryMasks(object):
+    """
+    Encode the license categories of the files of a comparison as integer
+    bitmasks: the LICENSE_CATEGORIES have fixed bits and any other category
+    gets the next free bit the first time this object sees it. The
+    `unique_mask` is the bitmask of the `unique_categories`, the notable
+    categories that score higher.
+    """
+
+    def __init__(self, unique_categories=()):
+        self.names = list(LICENSE_CATEGORIES)
+        self.bits = dict((name, 1 << bit) for bit, name in enumerate(self.names))
+        # the "<category> added" factor of each bit
+        self.factors = [name.lower() + " added" for name in self.names]
+        self.unique_mask = self.mask(unique_categories)
+
+    def bit(self, category):
+        """
+        Return the integer bit of a license `category` string.
+        """
+        bit = self.bits.get(category)
+        if bit is None:
+            bit = self.bits[category] = 1 << len(self.names)
+            self.names.append(category)
+            self.factors.append(category.lower() + " added")
+        return bit
+
+    def mask(self, categories):
+        """
+        Return the integer bitmask of an iterable of license `categories`.
+        """
+        mask = 0
+        for category in categories:
+            mask |= self.bit(category)
+        return mask
+
+    def license_mask(self, licenses):
+        """
+        Return the integer bitmask of the categories of a list of ScanCode
+        license mappings.
+        """
+        bits = self.bits
+        mask = 0
+        try:
+            for license in licenses:
+                mask |= bits[license.get("category", "")]
+        except KeyError:
+            # a category seen for the first time
+            return self.mask(license.get("category", "") for license in licenses)
+        return mask
+
+    def categories(self, mask):
+        """
+        Yield the license category strings of an integer bitmask, in bit
+        order.
+        """
+        bit = 0
+        while mask:
+            if mask & 1:
+                yield self.names[bit]
+            mask >>= 1
+            bit += 1
+
+
+def get_category_masks(unique_categories):
+    """
+    Return `unique_categories` if it is a CategoryMasks or else a new
+    CategoryMasks of these categories.
+    """
+    if isinstance(unique_categories, CategoryMasks):
+        return unique_categories
+    return CategoryMasks(unique_categories)
+
+
 def update_from_license_info(delta, unique_categories):
     """
     Increase an 'added' or 'modified' Delta object's 'score' attribute and add
     one or more appropriate categories to its 'factors' attribute if there has
     been a license change and depending on the nature of that change.
+
+    `unique_categories` is either a CategoryMasks, to share its bitmasks
+    across the Delta objects of a comparison, or the notable categories.
     """
     if delta.is_added():
         update_added_from_license_info(delta, unique_categories)
@@ -55,23 +152,35 @@ def update_added_from_license_info(delta, unique_categories):
     one or more categories to its 'factors' attribute if there has
     been a license change.
     """
-    new_licenses = (
-        delta.new_file.licenses if hasattr(delta.new_file, "licenses") else []
-    )
-
-    new_categories = set(license["category"] for license in new_licenses)
     if hasattr(delta.new_file, "licenses"):
+        masks = get_category_masks(unique_categories)
+        new_mask = masks.license_mask(delta.new_file.licenses)
         delta.update(20, "license info added")
-        for category in new_categories:
-            # no license ==> 'Copyleft Limited'or higher
-            if category in unique_categories:
-                delta.update(20, category.lower() + " added")
-            # no license ==> 'Permissive' or 'Public Domain'
-            else:
-                delta.update(0, category.lower() + " added")
+        add_category_factors(delta, masks, new_mask, 20)
         return
 
 
+def add_category_factors(delta, masks, added_mask, unique_score):
+    """
+    Add a "<category> added" factor to a Delta object for each category in
+    the `added_mask` bitmask of the `masks` CategoryMasks, scoring
+    `unique_score` for the notable categories and 0 for the others.
+    """
+    unique_mask = masks.unique_mask
+    factors = masks.factors
+    index = 0
+    while added_mask:
+        if added_mask & 1:
+            # ==> 'Copyleft Limited' or higher
+            if (1 << index) & unique_mask:
+                delta.update(unique_score, factors[index])
+            # ==> 'Permissive' or 'Public Domain'
+            else:
+                delta.update(0, factors[index])
+        added_mask >>= 1
+        index += 1
+
+
 def update_modified_from_license_info(delta, unique_categories):
     """
     Increase a 'modified' Delta object's 'score' attribute and add
@@ -90,41 +199,24 @@ def update_modified_from_license_info(delta, unique_categories):
         delta.update(15, "license info removed")
         return
 
-    new_categories = set(license.get("category", "")
-                         for license in new_licenses)
-    old_categories = set(license.get("category", "")
-                         for license in old_licenses)
-
     if new_licenses and not old_licenses:
+        masks = get_category_masks(unique_categories)
         delta.update(20, "license info added")
-
-        for category in new_categories:
-            # no license ==> 'Copyleft Limited'or higher
-            if category in unique_categories:
-                delta.update(20, category.lower() + " added")
-            # no license ==> 'Permissive' or 'Public Domain'
-            else:
-                delta.update(0, category.lower() + " added")
+        add_category_factors(delta, masks, masks.license_mask(new_licenses), 20)
         return
 
     new_keys = set(license.get("key", "") for license in new_licenses)
     old_keys = set(license.get("key", "") for license in old_licenses)
 
     if new_keys != old_keys:
-
+        masks = get_category_masks(unique_categories)
         delta.update(10, "license change")
-        for category in new_categories - old_categories:
-            unique_categories_in_old_file = len(
-                old_categories & unique_categories)
-            # 'Permissive' or 'Public Domain' ==> 'Copyleft Limited' or higher
-            if unique_categories_in_old_file == 0 and category in unique_categories:
-                delta.update(20, category.lower() + " added")
-            # at least 1 category in the old file was 'Copyleft Limited' or higher ==> 'Copyleft Limited' or higher
-            elif unique_categories_in_old_file != 0 and category in unique_categories:
-                delta.update(10, category.lower() + " added")
-            # 'Permissive' or 'Public Domain' ==> 'Permissive' or 'Public Domain' if not in old_categories
-            elif category not in unique_categories:
-                delta.update(0, category.lower() + " added")
+        new_mask = masks.license_mask(new_licenses)
+        old_mask = masks.license_mask(old_licenses)
+        # at least 1 category in the old file was 'Copyleft Limited' or higher
+        # ==> 'Copyleft Limited' or higher scores lower
+        unique_score = 10 if old_mask & masks.unique_mask else 20
+        add_category_factors(delta, masks, new_mask & ~old_mask, unique_score)
 
 
 def update_from_copyright_info(delta):
@@ -198,6 +290,53 @@ def collect_errors(deltacode):
     return errors
 
 
+DELTA_FIELDS = ("status", "factors", "score", "new", "old")
+FILE_FIELDS = (
+    "path",
+    "type",
+    "name",
+    "size",
+    "sha1",
+    "fingerprint",
+    "original_path",
+    "licenses",
+    "copyrights",
+)
+
+
+def parse_fields(fields):
+    """
+    Return a tuple of (delta fields, file fields) selected by `fields`, a
+    comma-separated string or an iterable of DELTA_FIELDS and FILE_FIELDS
+    names, each tuple in the order of the output.  Return None if `fields` is
+    empty, to select all the fields.
+
+    Selecting a file field without 'new' or 'old' selects both files, and
+    selecting 'new' or 'old' without any file field selects all the file
+    fields.  Without 'new', 'old' or a file field, no file field is selected.
+    Raise a ValueError for an unknown field name.
+    """
+    if not fields:
+        return
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = set(name.strip() for name in fields if name.strip())
+    unknown = names.difference(DELTA_FIELDS + FILE_FIELDS)
+    if unknown:
+        raise ValueError(
+            "Unknown field(s): {}. Valid fields are: {}".format(
+                ", ".join(sorted(unknown)), ", ".join(DELTA_FIELDS + FILE_FIELDS)
+            )
+        )
+    file_fields = tuple(name for name in FILE_FIELDS if name in names)
+    if file_fields and not names.intersection(("new", "old")):
+        names.update(("new", "old"))
+    if not file_fields and names.intersection(("new", "old")):
+        file_fields = FILE_FIELDS
+    delta_fields = tuple(name for name in DELTA_FIELDS if name in names)
+    return delta_fields, file_fields
+
+
 def deltas(deltacode, all_delta_types=False):
     """
     Return a generator of Delta dictionaries for JSON serialized ouput.  Omit
@@ -211,6 +350,160 @@ def deltas(deltacode, all_delta_types=False):
             yield delta.to_dict(deltacode)
 
 
+class JsonStream(object):
+    """
+    Incrementally decode JSON values from a text file-like object, reading
+    it in chunks so that only the value being decoded is kept in memory.
+    """
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+    def read_more(self, size=None):
+        """
+        Read the next chunk of the stream into the buffer, dropping the
+        already decoded text. Return False at the end of the stream.
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """
+        Return the next non-whitespace character without consuming it, or an
+        empty string at the end of the stream.
+        """
+        while True:
+            buffer = self.buffer
+            pos = self.pos
+            length = len(buffer)
+            while pos < length and buffer[pos] in " \t\n\r":
+                pos += 1
+            self.pos = pos
+            if pos < length:
+                return buffer[pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, chars):
+        """
+        Consume and return the next non-whitespace character, which must be
+        one of `chars`.
+        """
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError(
+                "Invalid JSON: expected one of {!r} but found {!r}".format(chars, char)
+            )
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """
+        Decode and return the next JSON value.
+        """
+        self.next_char()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may be cut short
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # read larger chunks for large values
+            self.read_more(size)
+            size *= 2
+
+
+def iter_json_deltas(location, headers=None, chunk_size=64 * 1024):
+    """
+    Yield the delta mappings of a DeltaCode JSON or JSON Lines output file at
+    `location`, possibly compressed, one at a time, without loading the whole
+    file in memory.
+
+    If a `headers` mapping is provided, it is updated with the top-level
+    results other than the deltas, e.g., 'deltacode_notice' or
+    'delta_stats', as they are read.
+    """
+    if headers is None:
+        headers = OrderedDict()
+
+    with open_input(location, "rt") as jsonf:
+        # the stream is never rewound: compressed streams may not seek
+        stream = JsonStream(jsonf, chunk_size)
+        stream.expect("{")
+        if stream.next_char() == "}":
+            stream.expect("}")
+        else:
+            while True:
+                key = stream.decode()
+                stream.expect(":")
+                if key == "deltas":
+                    stream.expect("[")
+                    if stream.next_char() == "]":
+                        stream.expect("]")
+                    else:
+                        while True:
+                            yield stream.decode()
+                            if stream.expect(",]") == "]":
+                                break
+                else:
+                    headers[key] = stream.decode()
+                if stream.expect(",}") == "}":
+                    break
+
+        # a JSON Lines file: the first object is the header line, then one
+        # delta per line
+        while stream.next_char():
+            yield stream.decode()
+
+
+def expand_delta(delta, headers):
+    """
+    Return a `delta` mapping read from a DeltaCode output in the full output
+    layout:
+    - for a dictionary-encoded output, replace the license and copyright
+      indexes of its files by the entries of the 'licenses' and 'copyrights'
+      tables of the `headers` mapping.
+    - for a changed-fields-only output, add the fields of the 'old' file
+      that are the same as in the 'new' file.
+    """
+    new, old = delta.get("new"), delta.get("old")
+    if new and old and len(old) < len(new):
+        delta["old"] = OrderedDict(
+            (key, old[key] if key in old else new[key]) for key in new
+        )
+
+    licenses = headers.get("licenses")
+    copyrights = headers.get("copyrights")
+    if licenses is None and copyrights is None:
+        return delta
+    for side in ("new", "old"):
+        file = delta.get(side)
+        if not file:
+            continue
+        if "licenses" in file:
+            file["licenses"] = [licenses[index] for index in file["licenses"]]
+        if "copyrights" in file:
+            file["copyrights"] = [copyrights[index] for index in file["copyrights"]]
+    return delta
+
+
 def calculate_percent(value, total):
     """
     Return the rounded value percentage of total.
@@ -246,6 +539,117 @@ class FileError(Exception):
         return self.message
 
 
+# the magic bytes at the start of a compressed file, by compression
+COMPRESSION_MAGIC = OrderedDict([
+    ("gzip", b"\x1f\x8b"),
+    ("xz", b"\xfd7zXZ\x00"),
+    ("zstd", b"\x28\xb5\x2f\xfd"),
+])
+
+# the file extensions of the compressed outputs, by compression
+COMPRESSION_EXTENSIONS = OrderedDict([
+    ("gzip", ".gz"),
+    ("xz", ".xz"),
+    ("zstd", ".zst"),
+])
+
+
+def has_zstandard():
+    """
+    Return True if the optional zstandard package is installed.
+    """
+    try:
+        import zstandard
+        return True
+    except ImportError:
+        return False
+
+
+def get_compression(location):
+    """
+    Return the compression of the file at `location` detected from its magic
+    bytes, one of the COMPRESSION_MAGIC keys, or None if it is not compressed.
+    """
+    with io.open(location, "rb") as f:
+        start = f.read(6)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if start.startswith(magic):
+            return compression
+
+
+def get_extension_compression(location):
+    """
+    Return the compression matching the file extension of `location`, one of
+    the COMPRESSION_EXTENSIONS keys, or None.
+    """
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if location.endswith(extension):
+            return compression
+
+
+def open_compressed(file, mode, compression):
+    """
+    Return a file object to read or write the `file` path or binary file
+    object with `compression` in `mode`, a text mode such as 'rt' or 'wt' or
+    a binary mode such as 'rb' or 'wb'.  A file object is not closed when the
+    returned file object is closed.
+
+    Raise a FileError if the compression needs a package that is not
+    installed.
+    """
+    encoding = None if "b" in mode else "utf-8"
+    if compression == "gzip":
+        return gzip.open(file, mode, encoding=encoding)
+    if compression == "xz":
+        return lzma.open(file, mode, encoding=encoding)
+    if compression == "zstd":
+        if not has_zstandard():
+            raise FileError("The zstandard package is required for zstd compressed files.")
+        import zstandard
+        closefd = None if isinstance(file, str) else False
+        return zstandard.open(file, mode, encoding=encoding, closefd=closefd)
+    raise ValueError("Unknown compression: {}".format(compression))
+
+
+def open_input(location, mode="rb"):
+    """
+    Return a file object to read the file at `location` in `mode`, 'rb' or
+    'rt', decompressing it as a stream if it is compressed.
+    """
+    compression = get_compression(location)
+    if compression:
+        return open_compressed(location, mode, compression)
+    if "b" in mode:
+        return io.open(location, "rb")
+    return io.open(location, "r", encoding="utf-8")
+
+
+def open_output(location, mode="w", compression=None):
+    """
+    Return a file object to write to the file at `location` in `mode`, 'w'
+    or 'wb', compressing it with `compression` or with the compression
+    matching its file extension.
+    """
+    compression = compression or get_extension_compression(location)
+    if compression:
+        return open_compressed(location, mode if "b" in mode else "wt", compression)
+    if "b" in mode:
+        return io.open(location, "wb")
+    return io.open(location, "w", encoding="utf-8")
+
+
+def load_scan(location):
+    """
+    Return the scan at `location` to load in a VirtualCodebase: the `location`
+    itself for an uncompressed file, or the mapping of the JSON data of a
+    compressed file, decompressed in memory.
+    """
+    if not get_compression(location):
+        return location
+    with open_input(location, "rb") as f:
+        return json.load(f)
+
+
 def align_trees(codebase1, codebase2):
     """
     Aligns the path of the two codebases
@@ -283,6 +687,88 @@ def align_trees(codebase1, codebase2):
     return a_segments - common_segments, b_segments - common_segments
 
 
+def aligned_path(path, offset):
+    """
+    Return a resource `path` without its first `offset` segments removed by
+    the tree alignment.
+    """
+    return "/".join(paths.split(path)[offset:])
+
+
+def match_resources(codebase1, codebase2, new_offset=0, old_offset=0):
+    """
+    Yield a tuple of (status, score, new resource, old resource, new aligned
+    path, old aligned path) for each file of the 'new' `codebase1` and the
+    'old' `codebase2` given their alignment offsets: first for each 'new' file
+    in walk order, then for each remaining 'old' file, a 'removed' one.
+
+    A 'new' file matches the 'old' file with its aligned path as a path and
+    the same sha1 or else the first unmatched 'old' file in walk order with
+    the same aligned path or the same sha1, i.e., an 'unmodified', 'modified'
+    or 'moved' file. Otherwise it is 'added'.  The 'old' files are indexed by
+    aligned path and by sha1 so each match is found without walking the
+    'old' codebase.
+    """
+    old_resources = {}
+    old_files = []
+    files_by_path = defaultdict(deque)
+    files_by_sha1 = defaultdict(deque)
+    for resource in codebase2.walk():
+        old_resources[resource.path] = resource
+        if resource.is_file:
+            path_old = aligned_path(resource.path, old_offset)
+            files_by_path[path_old].append(len(old_files))
+            files_by_sha1[resource.sha1].append(len(old_files))
+            old_files.append((resource, path_old))
+
+    # the paths of the matched 'old' resources
+    considered = set()
+
+    def first_unmatched(indexes):
+        # the matched files are never unmatched: drop them for good
+        while indexes and old_files[indexes[0]][0].path in considered:
+            indexes.popleft()
+        if indexes:
+            return indexes[0]
+
+    for new_resource in codebase1.walk():
+        if not new_resource.is_file:
+            continue
+        path_new = aligned_path(new_resource.path, new_offset)
+
+        old_resource = old_resources.get(clean_path(path_new))
+        if old_resource and old_resource.sha1 == new_resource.sha1:
+            considered.add(old_resource.path)
+            path_old = aligned_path(old_resource.path, old_offset)
+            yield "unmodified", 0, new_resource, old_resource, path_new, path_old
+            continue
+
+        candidates = [
+            index
+            for index in (
+                first_unmatched(files_by_path.get(path_new)),
+                first_unmatched(files_by_sha1.get(new_resource.sha1)),
+            )
+            if index is not None
+        ]
+        if not candidates:
+            yield "added", 100, new_resource, None, path_new, None
+            continue
+
+        old_resource, path_old = old_files[min(candidates)]
+        considered.add(old_resource.path)
+        if path_new != path_old:
+            yield "moved", 0, new_resource, old_resource, path_new, path_old
+        elif new_resource.sha1 == old_resource.sha1:
+            yield "unmodified", 0, new_resource, old_resource, path_new, path_old
+        else:
+            yield "modified", 20, new_resource, old_resource, path_new, path_old
+
+    for old_resource, path_old in old_files:
+        if old_resource.path not in considered:
+            yield "removed", 0, None, old_resource, None, path_old
+
+
 def get_notice():
     """
     Retrieve the notice text from the NOTICE file for display in the JSON output.
@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import io
+import os
+import threading
+
+import pytest
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import DeltaCode
+from deltacode import aio
+from deltacode.output import write_json
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor that records the number of calls and the largest
+    number of calls running at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+
+    def submit(self, function, *args, **kwargs):
+        def counted():
+            with self.lock:
+                self.calls += 1
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return super(CountingExecutor, self).submit(counted)
+
+
+class TestAio(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_adiff_is_the_DeltaCode_output(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+        options = aio.get_options(new_scan, old_scan)
+
+        deltacode = asyncio.run(aio.adiff(new_scan, old_scan))
+
+        result = io.StringIO()
+        write_json(deltacode, result)
+        expected = io.StringIO()
+        write_json(DeltaCode(new_scan, old_scan, options), expected)
+        assert result.getvalue() == expected.getvalue()
+
+    def test_adiff_batches(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+        deltacode = DeltaCode(new_scan, old_scan, aio.get_options(new_scan, old_scan), lazy=True)
+        expected = list(deltacode.iter_deltas())
+
+        async def collect(all_delta_types):
+            return [batch async for batch in aio.adiff_batches(
+                new_scan, old_scan, all_delta_types=all_delta_types, batch_size=50)]
+
+        batches = asyncio.run(collect(True))
+
+        assert [len(batch) for batch in batches[:-1]] == [50] * (len(batches) - 1)
+        assert [(delta.new_path, delta.old_path, delta.score) for batch in batches for delta in batch] == [
+            (delta.new_path, delta.old_path, delta.score) for delta in expected]
+
+        batches = asyncio.run(collect(False))
+        assert [delta.new_path for batch in batches for delta in batch] == [
+            delta.new_path for delta in expected if delta.status != 'unmodified']
+
+    def test_adiff_batches_yields_before_the_matching_ends(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+        executor = CountingExecutor(max_workers=1)
+
+        async def first_batch():
+            batches = aio.adiff_batches(
+                new_scan, old_scan, all_delta_types=True, batch_size=10, executor=executor)
+            batch = await batches.__anext__()
+            await batches.aclose()
+            return batch
+
+        try:
+            batch = asyncio.run(first_batch())
+        finally:
+            executor.shutdown()
+
+        assert len(batch) == 10
+        # the loading of the scans and the matching of a single batch
+        assert executor.calls == 2
+
+    def test_adiff_semaphore_caps_the_running_diffs(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        executor = CountingExecutor(max_workers=4)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(1)
+            return await asyncio.gather(*[
+                aio.adiff(new_scan, old_scan, semaphore=semaphore, executor=executor)
+                for _ in range(4)])
+
+        try:
+            results = asyncio.run(run_all())
+        finally:
+            executor.shutdown()
+
+        assert len(results) == 4
+        assert executor.max_running == 1
+
+    def test_adiff_can_be_cancelled(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+
+        async def cancel():
+            task = asyncio.ensure_future(aio.adiff(new_scan, old_scan))
+            await asyncio.sleep(0)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(cancel())
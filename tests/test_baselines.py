@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import random
+
+from click.testing import CliRunner
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import baselines
+
+
+class TestBaselines(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_similarity_estimates_the_jaccard_similarity(self):
+        generator = random.Random(42)
+        set1 = set(generator.getrandbits(64) for _ in range(5000))
+        set2 = set(list(set1)[:3000]) | set(generator.getrandbits(64) for _ in range(2000))
+        jaccard = len(set1 & set2) / len(set1 | set2)
+
+        estimate = baselines.similarity(baselines.sketch(set1), baselines.sketch(set2))
+
+        assert abs(estimate - jaccard) < 0.1
+        assert baselines.similarity(baselines.sketch(set1), baselines.sketch(set1)) == 1.0
+        assert baselines.similarity(baselines.sketch(set1), []) == 0.0
+
+    def test_similarity_is_exact_for_small_sets(self):
+        assert baselines.similarity(baselines.sketch([1, 2, 3]), baselines.sketch([2, 3, 4])) == 0.5
+
+    def test_BaselineIndex_query_ranks_the_closest_baseline_first(self):
+        index = baselines.BaselineIndex()
+        for scan in ('deltacode/coala-0.7.0-old.json', 'deltacode/sugar-0.108.0-old.json', 'cli/scan_sorted01_old.json'):
+            index.add(self.get_test_loc(scan))
+
+        ranked = index.query(self.get_test_loc('deltacode/sugar-0.114-new.json'))
+
+        assert [os.path.basename(path) for path, _, _ in ranked] == [
+            'sugar-0.108.0-old.json', 'coala-0.7.0-old.json', 'scan_sorted01_old.json']
+        assert ranked[0][2] > 0.9
+        assert len(index.query(self.get_test_loc('deltacode/sugar-0.114-new.json'), top=1)) == 1
+
+    def test_BaselineIndex_save_and_load(self):
+        index = baselines.BaselineIndex(sketch_size=16)
+        index.add(self.get_test_loc('deltacode/coala-0.7.0-old.json'))
+        index_file = self.get_temp_file('json.gz')
+
+        index.save(index_file)
+        loaded = baselines.BaselineIndex.load(index_file)
+
+        assert loaded.sketch_size == 16
+        assert loaded.baselines == index.baselines
+
+    def test_cli_index_and_query_with_diff(self):
+        index_file = self.get_temp_file('json')
+        result_file = self.get_temp_file('json')
+        runner = CliRunner()
+
+        result = runner.invoke(baselines.cli, [
+            'index', '-i', index_file,
+            self.get_test_loc('cli/scan_sorted01_old.json'),
+            self.get_test_loc('deltacode/coala-0.7.0-old.json'),
+        ])
+        assert result.exit_code == 0
+        result = runner.invoke(baselines.cli, [
+            'index', '-i', index_file, self.get_test_loc('deltacode/sugar-0.108.0-old.json')])
+        assert result.exit_code == 0
+
+        result = runner.invoke(baselines.cli, [
+            'query', '-i', index_file, '-j', result_file,
+            self.get_test_loc('cli/scan_sorted01_new.json'),
+        ])
+
+        assert result.exit_code == 0
+        with open(index_file) as f:
+            assert len(json.load(f)['baselines']) == 3
+        with open(result_file) as f:
+            results = json.load(f)
+        assert results['deltacode_options']['--old'].endswith('scan_sorted01_old.json')
+        assert results['deltas_count'] > 0
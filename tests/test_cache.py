@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+import os
+import stat
+import time
+
+import pytest
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import utils
+from deltacode.cache import ResultCache
+
+
+class TestCache(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_ResultCache_get_key(self):
+        new_scan = self.get_test_loc('cli/scan_sorted01_new.json')
+        old_scan = self.get_test_loc('cli/scan_sorted01_old.json')
+        compressed = self.get_temp_file('json.gz')
+        with open(new_scan, 'rb') as f, utils.open_output(compressed, 'wb') as outfile:
+            outfile.write(f.read())
+        cache = ResultCache(self.get_temp_dir())
+
+        key = cache.get_key(new_scan, old_scan, {'--all-delta-types': False})
+
+        assert cache.get_key(new_scan, old_scan, {'--all-delta-types': False}) == key
+        assert cache.get_key(compressed, old_scan, {'--all-delta-types': False}) == key
+        assert cache.get_key(new_scan, old_scan, {'--all-delta-types': True}) != key
+        assert cache.get_key(old_scan, new_scan, {'--all-delta-types': False}) != key
+
+    def test_ResultCache_writer(self):
+        cache = ResultCache(self.get_temp_dir())
+        assert cache.get('a') is None
+
+        with cache.writer('a') as cache_file:
+            cache_file.write('{}\n')
+        with pytest.raises(ValueError):
+            with cache.writer('b') as cache_file:
+                cache_file.write('{')
+                raise ValueError()
+
+        with cache.get('a') as cached:
+            assert cached.read() == '{}\n'
+        assert cache.get('b') is None
+        assert os.listdir(cache.directory) == ['a.json']
+
+    def test_ResultCache_writer_respects_umask(self):
+        cache = ResultCache(self.get_temp_dir())
+        umask = os.umask(0o022)
+        try:
+            with cache.writer('a') as cache_file:
+                cache_file.write('{}\n')
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(os.stat(cache.get_location('a')).st_mode) == 0o644
+
+    def test_ResultCache_evicts_least_recently_used(self):
+        cache = ResultCache(self.get_temp_dir(), max_size=25)
+        for key in ('a', 'b'):
+            with cache.writer(key) as cache_file:
+                cache_file.write('x' * 10)
+            os.utime(cache.get_location(key), (time.time() - 100, time.time() - 100))
+        # reading 'a' makes 'b' the least recently used
+        cache.get('a').close()
+
+        with cache.writer('c') as cache_file:
+            cache_file.write('x' * 10)
+
+        assert sorted(os.listdir(cache.directory)) == ['a.json', 'c.json']
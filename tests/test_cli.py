@@ -25,11 +25,12 @@
 
 from __future__ import absolute_import, print_function, unicode_literals, division
 
-import codecs
 from collections import OrderedDict
 import json
 import os
+import shutil
 
+import pytest
 import unicodecsv
 
 from click.testing import CliRunner
@@ -48,10 +49,10 @@ def load_csv(location):
     Load a CSV file at location and return a tuple of (field names, list of rows as
     mappings field->value).
     """
-    with codecs.open(location, "rb", encoding="utf-8") as csvin:
-        reader = unicodecsv.DictReader(csvin)
+    with open(location, "rb") as csvin:
+        reader = unicodecsv.DictReader(csvin, encoding="utf-8")
         fields = reader.fieldnames
-        values = sorted(reader)
+        values = list(reader)
         return fields, values
 
 
@@ -511,3 +512,539 @@ class TestCLI(FileBasedTesting):
             cli.cli, ['-xyz'], terminal_width=TERMINAL_WIDTH)
 
         assert 'Error: No such option: -x' in result.output
+
+    def test_json_lines_output(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_file = self.get_temp_file("json")
+        json_lines_file = self.get_temp_file("jsonl")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--json-lines', json_lines_file, '-a'], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        with open(json_lines_file) as lines:
+            lines = lines.read().splitlines()
+
+        header = json.loads(lines[0])
+        assert "deltas" not in header
+        assert header.get("deltas_count") == 7
+        assert header.get("delta_stats") == json_result.get("delta_stats")
+        assert header.get("deltacode_notice") == json_result.get("deltacode_notice")
+
+        assert len(lines) == 8
+        assert [json.loads(line) for line in lines[1:]] == json_result.get("deltas")
+
+    def test_json_lines_output_only(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_lines_file = self.get_temp_file("jsonl")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--json-lines', json_lines_file], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+        assert result.output == ""
+
+        with open(json_lines_file) as lines:
+            lines = lines.read().splitlines()
+
+        assert json.loads(lines[0]).get("deltas_count") == 4
+        assert len(lines) == 5
+        assert all(json.loads(line).get("status") != "unmodified" for line in lines[1:])
+
+    def test_csv_output_matches_json_output(self):
+        new_scan = self.get_test_loc("cli/scan_1_file_moved_new.json")
+        old_scan = self.get_test_loc("cli/scan_1_file_moved_old.json")
+
+        json_file = self.get_temp_file("json")
+        csv_file = self.get_temp_file("csv")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--csv', csv_file, '-a'], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+
+        fields, rows = load_csv(csv_file)
+        assert fields == ["Status", "Score", "Factors", "Path", "Name", "Type", "Size", "Old Path"]
+
+        expected = []
+        for delta in json.load(open(json_file)).get("deltas"):
+            new, old = delta.get("new") or {}, delta.get("old") or {}
+            expected.append({
+                "Status": delta.get("status"),
+                "Score": str(delta.get("score")),
+                "Factors": " ".join(delta.get("factors")),
+                "Path": new.get("original_path", old.get("original_path")),
+                "Name": new.get("name", old.get("name")),
+                "Type": new.get("type", old.get("type")),
+                "Size": str(new.get("size", old.get("size"))),
+                "Old Path": old.get("original_path") if delta.get("status") == "moved" else "",
+            })
+
+        assert len(rows) == 8
+        assert sorted(rows, key=lambda r: sorted(r.items())) == sorted(expected, key=lambda r: sorted(r.items()))
+
+    def test_csv_output_moved_row(self):
+        new_scan = self.get_test_loc("cli/scan_1_file_moved_new.json")
+        old_scan = self.get_test_loc("cli/scan_1_file_moved_old.json")
+
+        csv_file = self.get_temp_file("csv")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--csv', csv_file], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+        assert result.output == ""
+
+        _fields, rows = load_csv(csv_file)
+        assert rows == [
+            OrderedDict([
+                ("Status", "moved"),
+                ("Score", "0"),
+                ("Factors", ""),
+                ("Path", "1_file_moved_new/b/a4.py"),
+                ("Name", "a4.py"),
+                ("Type", "file"),
+                ("Size", "200"),
+                ("Old Path", "1_file_moved_old/a/a4.py"),
+            ])
+        ]
+
+    def test_parquet_and_arrow_output(self):
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_file = self.get_temp_file("json")
+        parquet_file = self.get_temp_file("parquet")
+        arrow_file = self.get_temp_file("arrow")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--parquet', parquet_file, '--arrow', arrow_file, '-a'], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        parquet_table = pq.read_table(parquet_file)
+        with pa.OSFile(arrow_file) as source:
+            arrow_table = pa.ipc.open_file(source).read_all()
+
+        assert parquet_table.equals(arrow_table)
+        assert parquet_table.num_rows == 7
+
+        metadata = parquet_table.schema.metadata
+        assert json.loads(metadata[b"delta_stats"]) == json_result.get("delta_stats")
+        assert json.loads(metadata[b"deltacode_options"]) == json_result.get("deltacode_options")
+
+        rows = parquet_table.to_pylist()
+        for row, delta in zip(rows, json_result.get("deltas")):
+            new, old = delta.get("new") or {}, delta.get("old") or {}
+            assert row["status"] == delta.get("status")
+            assert row["score"] == delta.get("score")
+            assert row["factors"] == delta.get("factors")
+            assert row["new_path"] == new.get("path")
+            assert row["old_path"] == old.get("path")
+            assert row["new_sha1"] == new.get("sha1")
+            assert row["old_size"] == old.get("size")
+            assert row["new_license_keys"] == (
+                [l["key"] for l in new["licenses"]] if new else None)
+            assert row["old_license_categories"] == (
+                [l["category"] for l in old["licenses"]] if old else None)
+
+    def test_sqlite_output(self):
+        import sqlite3
+
+        new_scan = self.get_test_loc("cli/scan_1_file_moved_new.json")
+        old_scan = self.get_test_loc("cli/scan_1_file_moved_old.json")
+
+        json_file = self.get_temp_file("json")
+        sqlite_file = self.get_temp_file("sqlite")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--sqlite', sqlite_file, '-a'], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        connection = sqlite3.connect(sqlite_file)
+
+        metadata = dict(connection.execute("SELECT key, value FROM metadata"))
+        assert json.loads(metadata["delta_stats"]) == json_result.get("delta_stats")
+        assert json.loads(metadata["deltas_count"]) == 8
+
+        assert connection.execute("SELECT COUNT(*) FROM deltas").fetchone() == (8,)
+
+        moved = connection.execute(
+            "SELECT d.score, n.path, n.original_path, o.path, o.original_path "
+            "FROM deltas d "
+            "JOIN files n ON d.new_file_id = n.id "
+            "JOIN files o ON d.old_file_id = o.id "
+            "WHERE d.status = 'moved'").fetchall()
+        assert moved == [
+            (0, "b/a4.py", "1_file_moved_new/b/a4.py", "a/a4.py", "1_file_moved_old/a/a4.py")
+        ]
+
+        license_keys = connection.execute(
+            "SELECT DISTINCT l.key FROM licenses l "
+            "JOIN files f ON l.file_id = f.id WHERE f.path = 'b/a4.py'").fetchall()
+        assert license_keys == [("apache-2.0",)]
+
+        holders = connection.execute(
+            "SELECT c.holders FROM copyrights c "
+            "JOIN files f ON c.file_id = f.id WHERE f.original_path = '1_file_moved_new/b/a4.py'").fetchone()
+        moved_delta = [d for d in json_result["deltas"] if d["status"] == "moved"].pop()
+        assert json.loads(holders[0]) == moved_delta["new"]["copyrights"][0]["holders"]
+
+        indexes = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")]
+        assert "deltas_status" in indexes
+        assert "licenses_key" in indexes
+        connection.close()
+
+    def test_msgpack_output(self):
+        pytest.importorskip("msgpack")
+        from deltacode.output import iter_msgpack_frames
+
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_file = self.get_temp_file("json")
+        msgpack_file = self.get_temp_file("msgpack")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--msgpack', msgpack_file], terminal_width=TERMINAL_WIDTH)
+
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        with open(msgpack_file, "rb") as stream:
+            frames = list(iter_msgpack_frames(stream))
+
+        header = frames[0]
+        json_deltas = json_result.pop("deltas")
+        assert header == json_result
+        assert frames[1:] == json_deltas
+
+    def test_json_output_dictionary_encode(self):
+        new_scan = self.get_test_loc("cli/scan_1_file_moved_new.json")
+        old_scan = self.get_test_loc("cli/scan_1_file_moved_old.json")
+
+        json_file = self.get_temp_file("json")
+        encoded_file = self.get_temp_file("json")
+        json_lines_file = self.get_temp_file("jsonl")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', encoded_file, '--json-lines', json_lines_file, '--dictionary-encode', '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        encoded_result = json.load(open(encoded_file))
+
+        assert os.path.getsize(encoded_file) < os.path.getsize(json_file)
+        assert encoded_result["licenses"] == [
+            {
+                "key": "apache-2.0",
+                "score": 40.0,
+                "short_name": "Apache 2.0",
+                "category": "Permissive",
+                "owner": "Apache Software Foundation",
+            }
+        ]
+        assert all(d["new"]["licenses"] == [0] for d in encoded_result["deltas"])
+
+        headers = {}
+        expanded = [utils.expand_delta(d, headers) for d in utils.iter_json_deltas(encoded_file, headers)]
+        assert expanded == json_result["deltas"]
+
+        headers = {}
+        expanded = [utils.expand_delta(d, headers) for d in utils.iter_json_deltas(json_lines_file, headers)]
+        assert expanded == json_result["deltas"]
+
+    def test_compressed_inputs_and_outputs(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        new_gzip = self.get_temp_file("scan")
+        old_xz = self.get_temp_file("scan")
+        for scan, compressed, compression in ((new_scan, new_gzip, 'gzip'), (old_scan, old_xz, 'xz')):
+            with open(scan, 'rb') as f, utils.open_output(compressed, 'wb', compression) as outfile:
+                outfile.write(f.read())
+
+        json_file = self.get_temp_file("json")
+        json_xz = self.get_temp_file("json")
+        csv_file = self.get_temp_file("csv")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        result = runner.invoke(cli.cli, [
+                               '-n', new_gzip, '-o',  old_xz, '-j', json_xz, '--csv', csv_file, '--compress', 'xz', '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        assert utils.get_compression(json_xz) == 'xz'
+        assert utils.get_compression(csv_file) == 'xz'
+        expected = json.load(open(json_file))
+        with utils.open_input(json_xz, 'rt') as infile:
+            result = json.load(infile)
+        assert result["deltas"] == expected["deltas"]
+        assert result["delta_stats"] == expected["delta_stats"]
+
+    def test_compressed_output_by_extension(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+        json_file = self.get_temp_file("json")
+        json_gzip = self.get_temp_file("json.gz")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--json-lines', json_gzip], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        assert utils.get_compression(json_gzip) == 'gzip'
+        assert list(utils.iter_json_deltas(json_gzip)) == json.load(open(json_file))["deltas"]
+
+    def test_json_output_stats_only(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+        json_file = self.get_temp_file("json")
+        stats_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', stats_file, '--stats-only'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        stats_result = json.load(open(stats_file))
+        assert "deltas" not in stats_result
+        assert stats_result["delta_stats"] == json.load(open(json_file))["delta_stats"]
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--csv', stats_file, '--stats-only'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
+
+    def test_json_output_cache_dir(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+        cache_dir = self.get_temp_dir()
+        json_file = self.get_temp_file("json")
+        cached_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--cache-dir', cache_dir], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        cached = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+        assert len(cached) == 1
+        assert open(cached[0]).read() == open(json_file).read()
+
+        # a cache hit returns the cached results without any diff
+        with open(cached[0], 'a') as f:
+            f.write('cached')
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', cached_file, '--cache-dir', cache_dir], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        assert open(cached_file).read() == open(json_file).read() + 'cached'
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', cached_file, '--cache-dir', cache_dir, '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        assert len(os.listdir(cache_dir)) == 2
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--csv', cached_file, '--cache-dir', cache_dir], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
+
+    def test_json_output_cache_dir_hit_from_other_paths(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+        new_copy = self.get_temp_file("json")
+        shutil.copy(new_scan, new_copy)
+        cache_dir = self.get_temp_dir()
+        json_file = self.get_temp_file("json")
+        cached_file = self.get_temp_file("json")
+        expected_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        for args in (['-n', new_scan, '-j', json_file, '--cache-dir', cache_dir],
+                     ['-n', new_copy, '-j', cached_file, '--cache-dir', cache_dir],
+                     ['-n', new_copy, '-j', expected_file]):
+            result = runner.invoke(cli.cli, args + ['-o', old_scan], terminal_width=TERMINAL_WIDTH)
+            assert result.exit_code == 0
+
+        # the copy hits the cache and its results have its own path
+        assert len(os.listdir(cache_dir)) == 1
+        assert open(cached_file).read() == open(expected_file).read()
+        assert json.load(open(cached_file))['deltacode_options']['--new'] == new_copy
+
+    def test_json_output_fields(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_file = self.get_temp_file("json")
+        json_lines_file = self.get_temp_file("jsonl")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--json-lines', json_lines_file,
+                               '--fields', 'status,score,factors,path'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        assert json_result["deltas_count"] == len(json_result["deltas"])
+        for delta in json_result["deltas"]:
+            assert list(delta) == ["status", "factors", "score", "new", "old"]
+            for file in (delta["new"], delta["old"]):
+                assert file is None or list(file) == ["path"]
+
+        headers = {}
+        assert list(utils.iter_json_deltas(json_lines_file, headers)) == json_result["deltas"]
+
+    def test_json_output_fields_unknown_field(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--fields', 'status,sha256'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
+        assert "Unknown field(s): sha256" in result.output
+
+    def test_json_output_changed_fields_only(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+
+        json_file = self.get_temp_file("json")
+        changed_file = self.get_temp_file("json")
+        json_lines_file = self.get_temp_file("jsonl")
+
+        runner = CliRunner()
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', changed_file, '--json-lines', json_lines_file,
+                               '--changed-fields-only', '--dictionary-encode', '-a'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        json_result = json.load(open(json_file))
+        changed_result = json.load(open(changed_file))
+
+        assert os.path.getsize(changed_file) < os.path.getsize(json_file)
+        for delta in changed_result["deltas"]:
+            if delta["new"] and delta["old"]:
+                assert list(delta["old"])[0] == "path"
+                assert len(delta["old"]) < len(delta["new"])
+            if delta["status"] == "unmodified":
+                assert sorted(delta["old"]) == ["original_path", "path"]
+            if delta["status"] in ("added", "removed"):
+                assert len((delta["new"] or delta["old"])) == 9
+
+        for location in (changed_file, json_lines_file):
+            headers = {}
+            expanded = [utils.expand_delta(d, headers) for d in utils.iter_json_deltas(location, headers)]
+            assert expanded == json_result["deltas"]
+
+    def test_fail_on_score_and_factor(self):
+        new_scan = self.get_test_loc("deltacode/score_license_change_no_copyright_change_new.json")
+        old_scan = self.get_test_loc("deltacode/score_license_change_no_copyright_change_old.json")
+        json_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--fail-on-factor', 'LICENSE CHANGE'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 1
+        assert 'Failing deltas: 1' in result.output
+        assert json.load(open(json_file))['deltas_count'] == 1
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--fail-on-score', '31', '--fail-on-factor', 'copyleft'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--fail-on-score', '30'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 1
+
+    def test_fail_fast_stops_at_the_first_failing_delta(self):
+        new_scan = self.get_test_loc("deltacode/coala-0.10.0-new.json")
+        old_scan = self.get_test_loc("deltacode/coala-0.7.0-old.json")
+        json_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--fail-on-score', '100', '--fail-fast'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 1
+        assert 'The diff fails on the delta:' in result.output
+        assert not os.path.getsize(json_file)
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--fail-on-score', '1000', '--fail-fast'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        with open(json_file) as f:
+            results = json.load(f)
+        expected = DeltaCode(new_scan, old_scan, OrderedDict([
+            ('--new', new_scan), ('--old', old_scan), ('--all-delta-types', False)]))
+        assert [d['new']['path'] if d['new'] else None for d in results['deltas']] == [
+            d.new_path for d in expected.deltas if d.status != 'unmodified']
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--fail-fast'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--stats-only', '--fail-on-score', '1'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
+
+    def test_time_budget_reports_the_truncated_stages(self):
+        new_scan = self.get_test_loc("cli/scan_sorted01_new.json")
+        old_scan = self.get_test_loc("cli/scan_sorted01_old.json")
+        json_file = self.get_temp_file("json")
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--time-budget', '0.000001'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        with open(json_file) as f:
+            results = json.load(f)
+        assert results['truncated_stages'][0] == 'match'
+        assert results['deltacode_errors']
+        assert results['delta_stats']['num_unclassified'] == results['deltas_count']
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '-j', json_file, '--time-budget', '3600'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 0
+        with open(json_file) as f:
+            assert 'truncated_stages' not in json.load(f)
+
+        result = runner.invoke(cli.cli, [
+                               '-n', new_scan, '-o',  old_scan, '--stats-only', '--time-budget', '1'], terminal_width=TERMINAL_WIDTH)
+        assert result.exit_code == 2
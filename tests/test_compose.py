@@ -0,0 +1,171 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict
+import io
+import json
+import os
+
+from click.testing import CliRunner
+import pytest
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import DeltaCode
+from deltacode import compose
+from deltacode.output import write_json
+from deltacode.output import write_json_lines
+
+
+class TestCompose(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def write_output(self, new, old, extension='json', writer=write_json, **kwargs):
+        """
+        Return the location of a DeltaCode output of the `new` and `old` test
+        scans with all the delta types.
+        """
+        new_scan = self.get_test_loc(new)
+        old_scan = self.get_test_loc(old)
+        options = OrderedDict([
+            ('--new', new_scan),
+            ('--old', old_scan),
+            ('--all-delta-types', True)
+        ])
+        location = self.get_temp_file(extension)
+        with io.open(location, 'w', encoding='utf-8') as outfile:
+            writer(DeltaCode(new_scan, old_scan, options), outfile, True, **kwargs)
+        return location
+
+    def compose(self, first, second):
+        outfile = io.StringIO()
+        compose.compose(first, second, outfile)
+        return outfile.getvalue()
+
+    def test_compose_is_the_direct_output(self):
+        first = self.write_output('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.7.0-old.json')
+        second = self.write_output('deltacode/coala-0.7.0-old.json', 'deltacode/coala-0.10.0-new.json')
+        third = self.write_output('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.10.0-new.json')
+
+        expected = self.write_output('deltacode/coala-0.7.0-old.json', 'deltacode/coala-0.7.0-old.json')
+        with io.open(expected, encoding='utf-8') as f:
+            assert self.compose(first, second) == f.read()
+
+        expected = self.write_output('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.7.0-old.json')
+        with io.open(expected, encoding='utf-8') as f:
+            assert self.compose(first, third) == f.read()
+
+    def test_compose_cancels_added_then_removed_files(self):
+        first = self.write_output('cli/scan_sorted01_new.json', 'cli/scan_sorted01_old.json')
+        second = self.write_output('cli/scan_sorted01_old.json', 'cli/scan_sorted01_new.json')
+
+        results = json.loads(self.compose(first, second))
+
+        assert set(delta['status'] for delta in results['deltas']) == {'unmodified'}
+        assert results['deltas_count'] == results['delta_stats']['old_files_count']
+        assert results['delta_stats']['percent_unmodified'] == 100.0
+
+    def test_compose_chains_moved_files(self):
+        first = self.write_output('deltacode/scan_1_file_moved_new.json', 'deltacode/scan_1_file_moved_old.json')
+        second = self.write_output('deltacode/scan_1_file_moved_new.json', 'deltacode/scan_1_file_moved_new.json')
+        expected = self.write_output('deltacode/scan_1_file_moved_new.json', 'deltacode/scan_1_file_moved_old.json')
+
+        results = json.loads(self.compose(first, second))
+
+        with io.open(expected, encoding='utf-8') as f:
+            expected = json.load(f)
+        assert [d['status'] for d in results['deltas']] == [d['status'] for d in expected['deltas']]
+        assert 'moved' in [d['status'] for d in results['deltas']]
+        assert results['delta_stats'] == expected['delta_stats']
+
+    def test_compose_identity_matches_duplicates_as_deltacode(self):
+        identity = self.write_output('deltacode/sample_duplicates_new.json', 'deltacode/sample_duplicates_new.json')
+        second = self.write_output('deltacode/sample_duplicates_old.json', 'deltacode/sample_duplicates_new.json')
+
+        with io.open(second, encoding='utf-8') as f:
+            assert self.compose(identity, second) == f.read()
+
+    def test_compose_scores_modified_files_with_the_license_rules(self):
+        first = self.write_output('deltacode/score_license_change_no_copyright_change_old.json', 'deltacode/score_license_change_no_copyright_change_old.json')
+        second = self.write_output('deltacode/score_license_change_no_copyright_change_new.json', 'deltacode/score_license_change_no_copyright_change_old.json')
+        expected = self.write_output('deltacode/score_license_change_no_copyright_change_new.json', 'deltacode/score_license_change_no_copyright_change_old.json')
+
+        results = json.loads(self.compose(first, second))
+
+        with io.open(expected, encoding='utf-8') as f:
+            expected = json.load(f)
+        assert [(d['status'], d['score'], d['factors']) for d in results['deltas']] == [
+            (d['status'], d['score'], d['factors']) for d in expected['deltas']]
+
+    def test_compose_reads_json_lines_dictionary_encoded_outputs(self):
+        first = self.write_output(
+            'deltacode/sugar-0.114-new.json', 'deltacode/sugar-0.108.0-old.json',
+            extension='jsonl', writer=write_json_lines, dictionary_encode=True, changed_only=True)
+        second = self.write_output('deltacode/sugar-0.108.0-old.json', 'deltacode/sugar-0.114-new.json')
+        expected = self.write_output('deltacode/sugar-0.108.0-old.json', 'deltacode/sugar-0.108.0-old.json')
+
+        with io.open(expected, encoding='utf-8') as f:
+            assert self.compose(first, second) == f.read()
+
+    def test_compose_keeps_only_the_changed_deltas(self):
+        first = self.write_output('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.7.0-old.json')
+        second = self.write_output('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.10.0-new.json')
+
+        composer = compose.Composer(first, second)
+        composer.read_first()
+        composer.read_second()
+
+        # the unmodified deltas are only counted until they are written
+        assert composer.unmodified_count
+        assert 'unmodified' not in set(delta.status for delta in composer.deltas)
+        assert len(composer.deltas) + composer.unmodified_count == len(list(composer.iter_ranked()))
+
+    def test_compose_requires_all_delta_types(self):
+        first = self.write_output('cli/scan_sorted01_new.json', 'cli/scan_sorted01_old.json')
+        second = self.get_temp_file('json')
+        new_scan = self.get_test_loc('cli/scan_sorted01_new.json')
+        options = OrderedDict([('--new', new_scan), ('--old', new_scan), ('--all-delta-types', False)])
+        with io.open(second, 'w', encoding='utf-8') as outfile:
+            write_json(DeltaCode(new_scan, new_scan, options), outfile)
+
+        with pytest.raises(compose.ComposeError):
+            self.compose(first, second)
+
+    def test_compose_cli(self):
+        first = self.write_output('cli/scan_sorted01_new.json', 'cli/scan_sorted01_old.json')
+        second = self.write_output('cli/scan_sorted01_old.json', 'cli/scan_sorted01_new.json')
+        result_file = self.get_temp_file('json.gz')
+
+        result = CliRunner().invoke(compose.cli, ['-f', first, '-s', second, '-j', result_file])
+
+        assert result.exit_code == 0
+        with io.open(result_file, 'rb') as f:
+            assert f.read(2) == b'\x1f\x8b'
+
+        result = CliRunner().invoke(compose.cli, ['-f', first, '-s', self.get_test_loc('cli/scan_sorted01_new.json')])
+        assert result.exit_code == 2
+        assert 'all delta types' in result.output
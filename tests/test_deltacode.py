@@ -64,6 +64,26 @@ class TestDeltacode(FileBasedTesting):
 
         assert old_offset == 2
 
+    def test_DeltaCode_offsets_are_per_instance(self):
+        aligned = DeltaCode(
+            self.get_test_loc('deltacode/ecos-align-index-new.json'),
+            self.get_test_loc('deltacode/ecos-align-index-old.json'),
+            OrderedDict([('--all-delta-types', True)]))
+        other = DeltaCode(
+            self.get_test_loc('cli/scan_sorted01_new.json'),
+            self.get_test_loc('cli/scan_sorted01_old.json'),
+            OrderedDict([('--all-delta-types', True)]))
+
+        assert aligned.offsets == (2, 2)
+        assert other.offsets == (1, 1)
+        # the Delta objects of a diff keep its own alignment
+        for delta in aligned.deltas:
+            assert (delta.new_offset, delta.old_offset) == (2, 2)
+            if delta.new_file:
+                delta.new_path = None
+                assert delta.aligned_path() == utils.aligned_path(delta.new_file.path, 2)
+        assert set((d.new_offset, d.old_offset) for d in other.deltas) == {(1, 1)}
+
     # def test_DeltaCode_ecos_failed_counts_assertion(self):
     #     new_scan = self.get_test_loc('deltacode/ecos-failed-counts-assertion-new.json')
     #     old_scan = self.get_test_loc('deltacode/ecos-failed-counts-assertion-old.json')
@@ -1679,3 +1699,170 @@ class TestDeltacode(FileBasedTesting):
         test_utils.run_scan_click(args)
         test_utils.check_json_scan(self.get_test_loc(
             'deltacode/scancode_options_expected.json'), result_file, regen=False)
+
+    def test_Delta_aligned_path(self):
+        new_scan = self.get_test_loc('deltacode/ecos-align-index-new.json')
+        old_scan = self.get_test_loc('deltacode/ecos-align-index-old.json')
+
+        deltacode_object = DeltaCode(new_scan, old_scan, {})
+
+        for delta in deltacode_object.deltas:
+            if delta.new_file:
+                assert delta.aligned_path(new_file=True) == get_aligned_path(
+                    delta, delta.new_file.path, new_file=True)
+            if delta.old_file:
+                assert delta.aligned_path(new_file=False) == get_aligned_path(
+                    delta, delta.old_file.path, new_file=False)
+
+    def test_get_stats_is_identical_to_DeltaCode_stats(self):
+        scans = [
+            ('deltacode/coala-0.10.0-new.json', 'deltacode/coala-0.7.0-old.json'),
+            ('deltacode/sugar-0.114-new.json', 'deltacode/sugar-0.108.0-old.json'),
+            ('deltacode/ecos-align-index-new.json', 'deltacode/ecos-align-index-old.json'),
+        ]
+        for new, old in scans:
+            new_scan = self.get_test_loc(new)
+            old_scan = self.get_test_loc(old)
+
+            deltacode_object = DeltaCode(new_scan, old_scan, {})
+            stats = deltacode.get_stats(*deltacode.load_codebases(new_scan, old_scan))
+
+            assert stats.to_dict() == deltacode_object.stats.to_dict()
+            for status in ('added', 'removed', 'moved', 'modified', 'unmodified'):
+                count = len([d for d in deltacode_object.deltas if d.status == status])
+                assert getattr(stats, 'num_' + status) == count
+
+    def test_load_codebases_missing_file(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+
+        with pytest.raises(utils.FileError):
+            deltacode.load_codebases(new_scan, new_scan + '.missing')
+
+    def test_DeltaCode_lazy_runs_only_the_stages_needed(self):
+        new_scan = self.get_test_loc('deltacode/score_license_change_no_copyright_change_new.json')
+        old_scan = self.get_test_loc('deltacode/score_license_change_no_copyright_change_old.json')
+        expected = DeltaCode(new_scan, old_scan, {})
+
+        result = DeltaCode(new_scan, old_scan, {}, lazy=True)
+        assert result.completed_stages == set()
+        assert result.codebase1 is None
+
+        deltas = result.match()
+
+        assert result.completed_stages == {'load', 'align', 'match'}
+        assert result.stats.to_dict() == expected.stats.to_dict()
+        assert all(delta.factors == [] for delta in deltas)
+        assert result.match() is deltas
+
+        assert result.rank() == deltas
+        assert result.completed_stages == set(DeltaCode.STAGES)
+        assert [(d.new_path, d.score, d.factors) for d in result.deltas] == [
+            (d.new_path, d.score, d.factors) for d in expected.deltas]
+        assert any(d.factors for d in result.deltas)
+
+    def test_DeltaCode_lazy_score_stage_runs_the_previous_stages(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+
+        result = DeltaCode(new_scan, old_scan, {}, lazy=True)
+        result.score_copyrights()
+
+        assert result.completed_stages == set(DeltaCode.STAGES[:5])
+        assert result.align() == utils.align_trees(result.codebase1, result.codebase2)
+
+    def test_DeltaCode_iter_deltas_yields_scored_deltas_in_matching_order(self):
+        new_scan = self.get_test_loc('deltacode/score_license_change_no_copyright_change_new.json')
+        old_scan = self.get_test_loc('deltacode/score_license_change_no_copyright_change_old.json')
+        expected = DeltaCode(new_scan, old_scan, {}, lazy=True)
+        expected.score_similarity()
+
+        result = DeltaCode(new_scan, old_scan, {}, lazy=True)
+        deltas = list(result.iter_deltas())
+
+        assert [(d.new_path, d.score, d.factors) for d in deltas] == [
+            (d.new_path, d.score, d.factors) for d in expected.deltas]
+        assert result.deltas == deltas
+        assert result.stats.to_dict() == expected.stats.to_dict()
+        assert 'score_similarity' in result.completed_stages
+        assert 'rank' not in result.completed_stages
+
+        ranked = list(result.iter_deltas(ranked=True))
+        assert [(d.new_path, d.score) for d in ranked] == [
+            (d.new_path, d.score) for d in DeltaCode(new_scan, old_scan, {}).deltas]
+
+    def test_DeltaCode_iter_deltas_stops_matching_with_the_caller(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        result = DeltaCode(new_scan, old_scan, {}, lazy=True)
+
+        deltas = result.iter_deltas()
+        first = [next(deltas) for _ in range(3)]
+        deltas.close()
+
+        assert len(first) == 3
+        assert result.deltas == []
+        assert result.completed_stages == {'load', 'align'}
+        assert len(result.match()) == len(DeltaCode(new_scan, old_scan, {}).deltas)
+
+    def test_DeltaCode_time_budget_marks_the_files_left_unclassified(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+
+        result = DeltaCode(new_scan, old_scan, {}, time_budget=0)
+
+        assert result.truncated_stages == [
+            'match', 'score_licenses', 'score_copyrights', 'score_similarity']
+        assert len(result.errors) == 4
+        assert set(delta.status for delta in result.deltas) == {'unclassified'}
+        assert len(result.deltas) == result.stats.new_files_count + result.stats.old_files_count
+        stats = result.stats.to_dict()
+        assert stats['num_unclassified'] == len(result.deltas)
+        assert 'percent_unclassified' not in stats
+        assert stats['percent_unmodified'] == 0
+
+    def test_DeltaCode_time_budget_spent_keeps_the_stats_consistent(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+
+        result = DeltaCode(new_scan, old_scan, {}, time_budget=0)
+
+        stats = result.stats
+        counts = [
+            stats.num_added, stats.num_removed, stats.num_moved, stats.num_modified,
+            stats.num_unmodified, stats.num_unclassified]
+        assert sum(counts) == len(result.deltas)
+        for status in ('added', 'removed', 'moved', 'modified', 'unmodified', 'unclassified'):
+            assert getattr(stats, 'num_' + status) == len(
+                [delta for delta in result.deltas if delta.status == status])
+        # every file has exactly one delta
+        assert sorted(d.new_file.path for d in result.deltas if d.new_file) == sorted(
+            r.path for r in result.codebase1.walk() if r.is_file)
+        assert sorted(d.old_file.path for d in result.deltas if d.old_file) == sorted(
+            r.path for r in result.codebase2.walk() if r.is_file)
+        assert all(getattr(stats, 'percent_' + status) == 0
+                   for status in ('added', 'removed', 'moved', 'modified', 'unmodified'))
+
+    def test_DeltaCode_time_budget_not_spent(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+        expected = DeltaCode(new_scan, old_scan, {})
+
+        result = DeltaCode(new_scan, old_scan, {}, time_budget=3600)
+
+        assert result.truncated_stages == []
+        assert result.errors == []
+        assert result.stats.to_dict() == expected.stats.to_dict()
+        assert 'num_unclassified' not in result.stats.to_dict()
+        assert [(d.new_path, d.status, d.score) for d in result.deltas] == [
+            (d.new_path, d.status, d.score) for d in expected.deltas]
+
+    def test_get_stats_with_duplicated_content(self):
+        # three 'new' and two 'old' files with the same content, and one
+        # 'new' and two 'old' files with another content: each 'old' file
+        # is matched once, so one 'new' file is added and one 'old' file is
+        # removed
+        new_scan = self.get_test_loc('deltacode/sample_duplicates_new.json')
+        old_scan = self.get_test_loc('deltacode/sample_duplicates_old.json')
+        stats = deltacode.get_stats(*deltacode.load_codebases(new_scan, old_scan))
+
+        assert (stats.num_added, stats.num_removed, stats.num_moved) == (1, 1, 3)
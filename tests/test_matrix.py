@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+from collections import Counter
+import io
+import json
+import os
+import random
+
+from click.testing import CliRunner
+import unicodecsv
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import matrix
+
+
+class TestMatrix(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_get_shared_counts_is_the_sum_of_the_smaller_counts(self):
+        generator = random.Random(42)
+        sha1_counts = [
+            Counter(generator.choice('abcdefgh') for _ in range(generator.randint(0, 20)))
+            for _ in range(6)
+        ]
+
+        shared = matrix.get_shared_counts(sha1_counts)
+
+        for index1, counts1 in enumerate(sha1_counts):
+            for index2, counts2 in enumerate(sha1_counts):
+                expected = sum(min(count, counts2[sha1]) for sha1, count in counts1.items())
+                assert shared[index1][index2] == expected
+
+    def test_get_stats(self):
+        stats = matrix.get_stats(old_files_count=10, new_files_count=12, shared_count=8)
+
+        assert (stats.num_added, stats.num_removed, stats.num_unmodified) == (4, 2, 8)
+        assert stats.to_dict()['percent_added'] == 40.0
+        assert stats.to_dict()['percent_unmodified'] == 80.0
+
+    def test_ScanMatrix_to_dict(self):
+        scans = [
+            self.get_test_loc('deltacode/sugar-0.108.0-old.json'),
+            self.get_test_loc('deltacode/sugar-0.114-new.json'),
+        ]
+
+        results = matrix.ScanMatrix(scans).to_dict()
+
+        assert results['files_counts'] == [132, 135]
+        row = results['matrix'][0]
+        assert row[0]['num_unmodified'] == 132
+        assert row[0]['percent_unmodified'] == 100.0
+        assert (row[1]['num_added'], row[1]['num_removed'], row[1]['num_unmodified']) == (124, 121, 11)
+        assert results['matrix'][1][0]['num_added'] == 121
+
+    def test_ScanMatrix_counts_a_moved_file_as_unmodified(self):
+        scans = [
+            self.get_test_loc('deltacode/scan_1_file_moved_old.json'),
+            self.get_test_loc('deltacode/scan_1_file_moved_new.json'),
+        ]
+
+        results = matrix.ScanMatrix(scans).to_dict()
+
+        cell = results['matrix'][0][1]
+        assert (cell['num_added'], cell['num_removed']) == (0, 0)
+        assert cell['num_unmodified'] == results['files_counts'][1]
+        assert cell['percent_unmodified'] == 100.0
+        assert 'percent_moved' not in cell
+        assert 'percent_modified' not in cell
+
+    def test_cli_writes_json_and_csv(self):
+        scans = [
+            self.get_test_loc('deltacode/coala-0.7.0-old.json'),
+            self.get_test_loc('deltacode/coala-0.10.0-new.json'),
+            self.get_test_loc('cli/scan_sorted01_old.json'),
+        ]
+        json_file = self.get_temp_file('json.gz')
+        csv_file = self.get_temp_file('csv')
+
+        result = CliRunner().invoke(matrix.cli, ['-j', json_file, '--csv', csv_file] + scans)
+
+        assert result.exit_code == 0
+        with io.open(json_file, 'rb') as f:
+            assert f.read(2) == b'\x1f\x8b'
+        with io.open(csv_file, 'rb') as f:
+            rows = list(unicodecsv.reader(f))
+        assert tuple(rows[0]) == matrix.CSV_HEADERS
+        assert len(rows) == 1 + 9
+        assert rows[2][:2] == [scans[0], scans[1]]
+
+        result = CliRunner().invoke(matrix.cli, scans[:1])
+        assert result.exit_code == 0
+        assert json.loads(result.output)['matrix'][0][0]['num_removed'] == 0
@@ -0,0 +1,232 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict
+import io
+import multiprocessing
+import os
+import pickle
+import sqlite3
+
+import pytest
+import simplejson
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import DeltaCode
+from deltacode import __version__
+from deltacode import output
+from deltacode.utils import collect_errors
+from deltacode.utils import deltas
+from deltacode.utils import get_notice
+from deltacode.utils import parse_fields
+
+
+def write_json_from_dicts(deltacode, outfile, all_delta_types=False):
+    """
+    Write the JSON results from the Delta.to_dict() OrderedDicts.
+    """
+    results = OrderedDict([
+        ('deltacode_notice', get_notice()),
+        ('new_scan_options', deltacode.new_scan_options),
+        ('old_scan_options', deltacode.old_scan_options),
+        ('deltacode_options', deltacode.options),
+        ('deltacode_version', __version__),
+        ('deltacode_errors', collect_errors(deltacode)),
+        ('deltas_count', len([d for d in deltas(deltacode, all_delta_types)])),
+        ('delta_stats', deltacode.stats.to_dict()),
+        ('deltas', deltas(deltacode, all_delta_types))
+    ])
+    simplejson.dump(results, outfile, iterable_as_array=True, indent=2)
+    outfile.write('\n')
+
+
+class TestOutput(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def check_write_json(self, new_scan, old_scan, all_delta_types):
+        options = OrderedDict([
+            ('--new', new_scan),
+            ('--old', old_scan),
+            ('--all-delta-types', all_delta_types)
+        ])
+        deltacode = DeltaCode(new_scan, old_scan, options)
+
+        expected = io.StringIO()
+        write_json_from_dicts(deltacode, expected, all_delta_types)
+        result = io.StringIO()
+        output.write_json(deltacode, result, all_delta_types)
+
+        assert result.getvalue() == expected.getvalue()
+
+    def test_write_json_is_identical_to_dicts_all_delta_types(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        self.check_write_json(new_scan, old_scan, True)
+
+    def test_write_json_is_identical_to_dicts_changed_only(self):
+        new_scan = self.get_test_loc('deltacode/sugar-0.114-new.json')
+        old_scan = self.get_test_loc('deltacode/sugar-0.108.0-old.json')
+        self.check_write_json(new_scan, old_scan, False)
+
+    def test_write_json_is_identical_to_dicts_copyright_unusual_characters(self):
+        new_scan = self.get_test_loc('deltacode/scan_unusual_characters_new.json')
+        old_scan = self.get_test_loc('deltacode/scan_unusual_characters_old.json')
+        self.check_write_json(new_scan, old_scan, True)
+
+    def test_write_json_no_deltas(self):
+        new_scan = self.get_test_loc('cli/scan_1_file_moved_new.json')
+        deltacode = DeltaCode(new_scan, new_scan, OrderedDict([('--all-delta-types', False)]))
+
+        result = io.StringIO()
+        output.write_json(deltacode, result, False)
+
+        assert '"deltas_count": 0,' in result.getvalue()
+        assert result.getvalue().endswith('  "deltas": []\n}\n')
+
+    def test_JsonDeltaEncoder_compact(self):
+        encoder = output.JsonDeltaEncoder(indent=None)
+
+        value = OrderedDict([('a', [1, 2.5, None]), ('b', {}), ('c', 'dé')])
+
+        assert encoder.encode_value(value) == '{"a":[1,2.5,null],"b":{},"c":"d\\u00e9"}'
+
+    def test_write_json_fields_is_identical_to_dicts(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', True)]))
+        fields = parse_fields('score,status,path,licenses')
+
+        result = io.StringIO()
+        output.write_json(deltacode, result, True, fields=fields)
+
+        result_deltas = simplejson.loads(result.getvalue())['deltas']
+        expected = [delta.to_dict(deltacode, fields) for delta in deltacode.deltas]
+        assert result_deltas == simplejson.loads(simplejson.dumps(expected))
+        assert list(result_deltas[0]) == ['status', 'score', 'new', 'old']
+        assert list(result_deltas[0]['new']) == ['path', 'licenses']
+
+    def test_write_json_fields_dictionary_encode_skips_tables(self):
+        new_scan = self.get_test_loc('deltacode/scan_unusual_characters_new.json')
+        old_scan = self.get_test_loc('deltacode/scan_unusual_characters_old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', True)]))
+
+        result = io.StringIO()
+        output.write_json(deltacode, result, True, dictionary_encode=True,
+                          fields=parse_fields('status,licenses'))
+
+        results = simplejson.loads(result.getvalue())
+        assert 'copyrights' not in results
+        assert results['licenses']
+        assert list(results['deltas'][0]['new'] or results['deltas'][0]['old']) == ['licenses']
+
+    def test_write_json_processes_is_identical_to_sequential(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', False)]))
+
+        for writer in (output.write_json, output.write_json_lines):
+            for all_delta_types in (True, False):
+                expected = io.StringIO()
+                writer(deltacode, expected, all_delta_types, dictionary_encode=True)
+                result = io.StringIO()
+                writer(deltacode, result, all_delta_types, dictionary_encode=True,
+                       processes=2, chunk_size=7)
+
+                assert result.getvalue() == expected.getvalue()
+
+    def test_iter_encoded_chunks_single_chunk_is_sequential(self):
+        new_scan = self.get_test_loc('cli/scan_1_file_moved_new.json')
+        old_scan = self.get_test_loc('cli/scan_1_file_moved_old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', False)]))
+        deltas = deltacode.deltas
+        encoder = output.JsonDeltaEncoder()
+
+        chunks = output.iter_encoded_chunks(deltacode, deltas, encoder, 0, '\n', processes=2,
+                                            chunk_size=len(deltas))
+        # no worker process is started for a single chunk
+        first = next(chunks)
+        assert multiprocessing.active_children() == []
+        assert list(chunks) == []
+        assert [first] == list(output.iter_encoded_chunks(deltacode, deltas, encoder, 0, '\n'))
+
+    def test_delta_record_is_picklable(self):
+        new_scan = self.get_test_loc('cli/scan_1_file_moved_new.json')
+        old_scan = self.get_test_loc('cli/scan_1_file_moved_old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', False)]))
+        delta = [d for d in deltacode.deltas if d.status == 'moved'][0]
+
+        record = pickle.loads(pickle.dumps(output.delta_record(delta)))
+
+        encoder = output.JsonDeltaEncoder()
+        assert encoder.encode_delta(record) == encoder.encode_delta(delta)
+
+    def test_write_arrow_record_batches(self):
+        pytest.importorskip('pyarrow')
+        import pyarrow.parquet as pq
+
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', True)]))
+
+        result_file = self.get_temp_file('parquet')
+        output.write_arrow(deltacode, result_file, True, batch_size=10)
+
+        table = pq.read_table(result_file)
+        assert table.num_rows == len(deltacode.deltas)
+        assert table.column('status').to_pylist() == [d.status for d in deltacode.deltas]
+        assert table.column('score').to_pylist() == [d.score for d in deltacode.deltas]
+
+    def test_write_sqlite_batches(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        deltacode = DeltaCode(new_scan, old_scan, OrderedDict([('--all-delta-types', True)]))
+
+        result_file = self.get_temp_file('sqlite')
+        output.write_sqlite(deltacode, result_file, True, batch_size=3)
+        # an existing database is replaced
+        output.write_sqlite(deltacode, result_file, True, batch_size=3)
+
+        connection = sqlite3.connect(result_file)
+        statuses = [row[0] for row in connection.execute('SELECT status FROM deltas ORDER BY id')]
+        assert statuses == [d.status for d in deltacode.deltas]
+
+        files_count = sum(bool(d.new_file) + bool(d.old_file) for d in deltacode.deltas)
+        assert connection.execute('SELECT COUNT(*) FROM files').fetchone() == (files_count,)
+
+        factors_count = sum(len(d.factors) for d in deltacode.deltas)
+        assert connection.execute('SELECT COUNT(*) FROM factors').fetchone() == (factors_count,)
+        connection.close()
+
+    def test_iter_msgpack_frames_truncated(self):
+        msgpack = pytest.importorskip('msgpack')
+
+        frame = msgpack.packb({'status': 'added'})
+        stream = io.BytesIO(output.MSGPACK_FRAME_PREFIX.pack(len(frame)) + frame[:-1])
+
+        with pytest.raises(ValueError):
+            list(output.iter_msgpack_frames(stream))
@@ -0,0 +1,191 @@
+#
+# Copyright (c) 2017-2018 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/aboutcode-org/deltacode/
+# The DeltaCode software is licensed under the Apache License version 2.0.
+# Data generated with DeltaCode require an acknowledgment.
+# DeltaCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with DeltaCode or any DeltaCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with DeltaCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  DeltaCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  DeltaCode is a free and open source software analysis tool from nexB Inc. and others.
+#  Visit https://github.com/aboutcode-org/deltacode/ for support and download.
+#
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict
+import http.client
+import io
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from commoncode.testcase import FileBasedTesting
+from deltacode import DeltaCode
+from deltacode import output
+from deltacode import server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    An HTTPConnection to a server listening on a Unix socket.
+    """
+
+    def __init__(self, socket_path):
+        http.client.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TestServer(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def start_server(self, service, socket_path=None):
+        diff_server = server.make_server(service, port=0, socket_path=socket_path, quiet=True)
+        thread = threading.Thread(target=diff_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(diff_server.server_close)
+        self.addCleanup(diff_server.shutdown)
+        return diff_server
+
+    def request(self, connection, method, path, body=None):
+        if body is not None:
+            body = json.dumps(body)
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, response.read().decode('utf-8')
+
+    def test_diff_is_identical_to_write_json_and_uses_the_cache(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        diff_server = self.start_server(server.DiffService())
+        connection = http.client.HTTPConnection('127.0.0.1', diff_server.server_address[1])
+
+        request = {'new': new_scan, 'old': old_scan, 'all_delta_types': True}
+        for _ in range(3):
+            status, results = self.request(connection, 'POST', '/diff', request)
+            assert status == 200
+
+        options = OrderedDict([('--new', new_scan), ('--old', old_scan), ('--all-delta-types', True)])
+        expected = io.StringIO()
+        output.write_json(DeltaCode(new_scan, old_scan, options), expected, True)
+        assert results == expected.getvalue()
+
+        status, stats = self.request(connection, 'GET', '/stats')
+        stats = json.loads(stats)
+        assert stats['cache']['entries'] == 2
+        assert stats['cache']['misses'] == 2
+        assert stats['cache']['hits'] == 4
+        assert stats['requests']['completed'] == 3
+
+    def test_diff_bad_requests(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        diff_server = self.start_server(server.DiffService())
+        connection = http.client.HTTPConnection('127.0.0.1', diff_server.server_address[1])
+
+        assert self.request(connection, 'POST', '/diff', {'new': new_scan})[0] == 400
+        assert self.request(connection, 'POST', '/diff', {'new': new_scan, 'old': new_scan + '.missing'})[0] == 400
+        assert self.request(connection, 'POST', '/diff', {'new': new_scan, 'old': new_scan, 'fields': 'sha256'})[0] == 400
+        assert self.request(connection, 'GET', '/unknown')[0] == 404
+
+    def test_diff_malformed_scan_is_a_server_error(self):
+        scan = self.get_temp_file('json')
+        with open(scan, 'w') as f:
+            json.dump({'files': [{'path': 1}]}, f)
+        diff_server = self.start_server(server.DiffService())
+        connection = http.client.HTTPConnection('127.0.0.1', diff_server.server_address[1])
+
+        status, results = self.request(connection, 'POST', '/diff', {'new': scan, 'old': scan})
+
+        assert status == 500
+        assert 'AttributeError' in json.loads(results)['error']
+        assert self.request(connection, 'GET', '/stats')[0] == 200
+
+    def test_diff_busy(self):
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        service = server.DiffService(max_diffs=1, queue_timeout=0)
+
+        service.slots.acquire()
+        with pytest.raises(server.ServiceBusy):
+            service.diff({'new': new_scan, 'old': new_scan})
+        service.slots.release()
+
+        assert service.to_dict()['requests']['rejected'] == 1
+
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets are not available')
+    def test_diff_on_unix_socket_stats_only(self):
+        new_scan = self.get_test_loc('cli/scan_sorted01_new.json')
+        old_scan = self.get_test_loc('cli/scan_sorted01_old.json')
+        socket_path = os.path.join(self.get_temp_dir(), 'deltacode.sock')
+        self.start_server(server.DiffService(), socket_path)
+
+        connection = UnixHTTPConnection(socket_path)
+        status, results = self.request(connection, 'POST', '/diff', {'new': new_scan, 'old': old_scan, 'stats_only': True})
+
+        assert status == 200
+        options = OrderedDict([('--new', new_scan), ('--old', old_scan), ('--all-delta-types', False)])
+        expected = DeltaCode(new_scan, old_scan, options).stats.to_dict()
+        assert json.loads(results)['delta_stats'] == expected
+
+    def test_CodebaseCache_evicts_least_recently_used(self):
+        scans = [
+            self.get_test_loc('cli/scan_sorted01_new.json'),
+            self.get_test_loc('cli/scan_sorted01_old.json'),
+            self.get_test_loc('cli/scan_1_file_moved_new.json'),
+        ]
+        sizes = [os.path.getsize(scan) for scan in scans]
+        cache = server.CodebaseCache(max_bytes=sizes[0] + sizes[1] + sizes[2] - 1)
+
+        first = cache.get(scans[0])
+        cache.get(scans[1])
+        assert cache.get(scans[0]) is first
+        cache.get(scans[2])
+
+        stats = cache.to_dict()
+        assert stats['entries'] == 2
+        assert stats['evictions'] == 1
+        assert stats['size'] == sizes[0] + sizes[2]
+        assert cache.get(scans[0]) is first
+
+    def test_CodebaseCache_reads_a_scan_only_when_it_changes(self):
+        scan = self.get_temp_file('json')
+        with open(self.get_test_loc('cli/scan_sorted01_new.json')) as f:
+            content = f.read()
+        with open(scan, 'w') as f:
+            f.write(content)
+        cache = server.CodebaseCache()
+
+        first = cache.get(scan)
+        assert cache.get(scan) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # the same content with a new modification time is not loaded again
+        status = os.stat(scan)
+        os.utime(scan, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+        assert cache.get(scan) is first
+        assert cache.misses == 2
+        assert cache.to_dict()['entries'] == 1
+
+        with open(scan, 'w') as f:
+            f.write(content.replace('"files"', '"files" ', 1))
+        assert cache.get(scan) is not first
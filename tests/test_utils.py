@@ -29,6 +29,7 @@ import codecs
 from collections import OrderedDict
 import json
 import os
+import tracemalloc
 
 import pytest
 import unicodecsv
@@ -41,6 +42,7 @@ import deltacode
 from deltacode import utils
 from deltacode import models
 from deltacode import DeltaCode
+from deltacode import output
 
 
 unique_categories = set([
@@ -712,3 +714,233 @@ class TestUtils(FileBasedTesting):
         with pytest.raises(utils.AlignmentException):
             result_seg_new, result_seg_old = utils.align_trees(
                 new_scan, old_scan)
+
+    def test_CategoryMasks_round_trip(self):
+        masks = utils.CategoryMasks()
+
+        mask = masks.mask(['Copyleft', 'Permissive', 'Commercial'])
+
+        assert mask == 0b1000011
+        assert list(masks.categories(mask)) == [
+            'Commercial',
+            'Copyleft',
+            'Permissive'
+        ]
+
+    def test_CategoryMasks_unknown_category(self):
+        masks = utils.CategoryMasks()
+        known = masks.mask(utils.LICENSE_CATEGORIES)
+
+        bit = masks.bit('Some Unknown Category')
+
+        assert bit & known == 0
+        assert masks.bit('Some Unknown Category') == bit
+        assert list(masks.categories(bit)) == ['Some Unknown Category']
+        assert masks.factors[-1] == 'some unknown category added'
+        # each CategoryMasks has its own unknown categories
+        assert 'Some Unknown Category' not in utils.CategoryMasks().bits
+
+    def test_CategoryMasks_unique_mask(self):
+        masks = utils.CategoryMasks(['Copyleft', 'Commercial'])
+
+        assert masks.unique_mask == masks.mask(['Commercial', 'Copyleft'])
+
+    def test_parse_fields(self):
+        assert utils.parse_fields(None) is None
+        assert utils.parse_fields('') is None
+        assert utils.parse_fields('score, status,path') == (
+            ('status', 'score', 'new', 'old'),
+            ('path',)
+        )
+        assert utils.parse_fields(['old', 'factors']) == (
+            ('factors', 'old'),
+            utils.FILE_FIELDS
+        )
+        assert utils.parse_fields('status,score') == (('status', 'score'), ())
+
+    def test_parse_fields_unknown_field(self):
+        with pytest.raises(ValueError):
+            utils.parse_fields('status,sha256')
+
+    def test_CategoryMasks_license_mask(self):
+        licenses = [
+            {'key': 'gpl-2.0', 'category': 'Copyleft'},
+            {'key': 'mit', 'category': 'Permissive'},
+            {'key': 'apache-2.0', 'category': 'Permissive'},
+        ]
+
+        masks = utils.CategoryMasks()
+
+        mask = masks.license_mask(licenses)
+
+        assert mask == masks.mask(['Copyleft', 'Permissive'])
+
+    def test_update_from_license_info_one_permissive_to_six_copyleft_or_higher_factors_order(self):
+        test_file_new = self.get_test_loc(
+            'utils/update_from_license_info_one_permissive_to_six_copyleft_or_higher_new.json')
+        test_file_old = self.get_test_loc(
+            'utils/update_from_license_info_one_permissive_to_six_copyleft_or_higher_old.json')
+
+        results = DeltaCode(test_file_new, test_file_old, {})
+
+        expected_factors = [
+            'license change',
+            'commercial added',
+            'copyleft added',
+            'copyleft limited added',
+            'free restricted added',
+            'patent license added',
+            'proprietary free added'
+        ]
+
+        assert results.deltas[0].factors == expected_factors
+
+    def write_outputs(self):
+        """
+        Return a tuple of (JSON file, JSON Lines file, loaded JSON results)
+        written for a test pair of scans.
+        """
+        new_scan = self.get_test_loc('deltacode/coala-0.10.0-new.json')
+        old_scan = self.get_test_loc('deltacode/coala-0.7.0-old.json')
+        deltacode_object = DeltaCode(
+            new_scan, old_scan, OrderedDict([('--all-delta-types', True)]))
+
+        json_file = self.get_temp_file('json')
+        with open(json_file, 'w') as outfile:
+            output.write_json(deltacode_object, outfile, True)
+        json_lines_file = self.get_temp_file('jsonl')
+        with open(json_lines_file, 'w') as outfile:
+            output.write_json_lines(deltacode_object, outfile, True)
+
+        with open(json_file) as jsonf:
+            results = json.load(jsonf, object_pairs_hook=OrderedDict)
+        return json_file, json_lines_file, results
+
+    def test_iter_json_deltas_json(self):
+        json_file, _json_lines_file, expected = self.write_outputs()
+
+        headers = OrderedDict()
+        result = list(utils.iter_json_deltas(json_file, headers))
+
+        assert result == expected['deltas']
+        assert 'deltas' not in headers
+        assert headers['delta_stats'] == expected['delta_stats']
+        assert headers['deltas_count'] == len(result)
+
+    def test_iter_json_deltas_json_small_chunks(self):
+        json_file, _json_lines_file, expected = self.write_outputs()
+
+        result = list(utils.iter_json_deltas(json_file, chunk_size=7))
+
+        assert result == expected['deltas']
+
+    def test_iter_json_deltas_json_lines(self):
+        _json_file, json_lines_file, expected = self.write_outputs()
+
+        headers = OrderedDict()
+        result = list(utils.iter_json_deltas(json_lines_file, headers))
+
+        assert result == expected['deltas']
+        assert headers['delta_stats'] == expected['delta_stats']
+
+    def test_iter_json_deltas_is_lazy(self):
+        json_file, _json_lines_file, expected = self.write_outputs()
+
+        deltas = utils.iter_json_deltas(json_file, chunk_size=1024)
+
+        assert next(deltas) == expected['deltas'][0]
+
+    def test_iter_json_deltas_compact_json(self):
+        _json_file, _json_lines_file, expected = self.write_outputs()
+        compact_file = self.get_temp_file('json')
+        with open(compact_file, 'w') as outfile:
+            json.dump(dict(expected, deltas=expected['deltas'] * 60), outfile)
+        assert os.path.getsize(compact_file) > 4 * 1024 * 1024
+
+        headers = OrderedDict()
+        deltas = utils.iter_json_deltas(compact_file, headers)
+        # a single line document is streamed, not read as a whole line
+        tracemalloc.start()
+        try:
+            first = next(deltas)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert first == expected['deltas'][0]
+        assert peak < 1024 * 1024
+        assert list(deltas) == (expected['deltas'] * 60)[1:]
+        assert headers['delta_stats'] == expected['delta_stats']
+
+    def test_iter_json_deltas_compressed(self):
+        _json_file, _json_lines_file, expected = self.write_outputs()
+        deltacode_object = DeltaCode(
+            self.get_test_loc('deltacode/coala-0.10.0-new.json'),
+            self.get_test_loc('deltacode/coala-0.7.0-old.json'),
+            OrderedDict([('--all-delta-types', True)]))
+        for compression in ('gzip', 'xz', 'zstd'):
+            if compression == 'zstd' and not utils.has_zstandard():
+                continue
+            extension = utils.COMPRESSION_EXTENSIONS[compression]
+            for writer in (output.write_json, output.write_json_lines):
+                test_file = self.get_temp_file('json' + extension)
+                with utils.open_output(test_file) as outfile:
+                    writer(deltacode_object, outfile, True)
+
+                headers = OrderedDict()
+                assert list(utils.iter_json_deltas(test_file, headers)) == expected['deltas']
+                assert headers['delta_stats'] == expected['delta_stats']
+
+    def test_iter_json_deltas_invalid_json(self):
+        test_file = self.get_temp_file('json')
+        with open(test_file, 'w') as jsonf:
+            jsonf.write('{\n  "deltas": [\n    {"status": "added"},\n')
+
+        with pytest.raises(ValueError):
+            list(utils.iter_json_deltas(test_file))
+
+    def test_open_output_and_open_input_compressed(self):
+        for compression in ('gzip', 'xz', 'zstd'):
+            if compression == 'zstd' and not utils.has_zstandard():
+                continue
+            extension = utils.COMPRESSION_EXTENSIONS[compression]
+            test_file = self.get_temp_file('json' + extension)
+            with utils.open_output(test_file) as outfile:
+                outfile.write('{"deltas": []}\n')
+
+            assert utils.get_compression(test_file) == compression
+            with utils.open_input(test_file, 'rt') as infile:
+                assert infile.read() == '{"deltas": []}\n'
+
+    def test_open_output_compression_overrides_extension(self):
+        test_file = self.get_temp_file('json')
+        with utils.open_output(test_file, 'wb', compression='gzip') as outfile:
+            outfile.write(b'{}')
+
+        assert utils.get_compression(test_file) == 'gzip'
+
+    def test_load_scan_compressed(self):
+        scan = self.get_test_loc('deltacode/scan_1_file_moved_new.json')
+        test_file = self.get_temp_file('json.xz')
+        with open(scan, 'rb') as f, utils.open_output(test_file, 'wb') as outfile:
+            outfile.write(f.read())
+
+        assert utils.load_scan(scan) == scan
+        with open(scan) as f:
+            assert utils.load_scan(test_file) == json.load(f)
+
+    def test_match_resources_first_match_in_walk_order(self):
+        new_scan = self.get_test_loc('deltacode/scan_1_file_moved_new.json')
+        old_scan = self.get_test_loc('deltacode/scan_1_file_moved_old.json')
+        codebase1 = VirtualCodebase(new_scan)
+        codebase2 = VirtualCodebase(old_scan)
+        new_offset, old_offset = utils.align_trees(codebase1, codebase2)
+
+        matches = list(utils.match_resources(codebase1, codebase2, new_offset, old_offset))
+
+        statuses = [match[0] for match in matches]
+        assert statuses.count('moved') == 1
+        assert statuses.count('unmodified') == len(statuses) - 1
+        moved = matches[statuses.index('moved')]
+        assert moved[4:] == ('b/a4.py', 'a/a4.py')
+        assert moved[2].sha1 == moved[3].sha1